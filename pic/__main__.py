@@ -3,80 +3,304 @@
 if __name__ == "__main__":
     print("Running simulation...")
     # Import the necessary modules
-    import sys
+    import argparse
 
-    if len(sys.argv) > 1:
-        method = str(sys.argv[1])
-    else:
-        method = "euler"
+    from pic.integrator import PUSHERS, RZ_PUSHERS
+
+    parser = argparse.ArgumentParser(prog="python -m pic")
+    parser.add_argument("method", nargs="?", default="euler", choices=sorted(PUSHERS))
+    parser.add_argument(
+        "--Bz",
+        type=float,
+        default=0.0,
+        help="uniform magnetic field along z (T), the axis of axisymmetric runs",
+    )
+    parser.add_argument(
+        "--wall-rf",
+        type=float,
+        nargs=2,
+        metavar=("AMP", "FREQ"),
+        help="add a sinusoid of amplitude AMP (V) and frequency FREQ (Hz) to the wall voltage",
+    )
+    parser.add_argument(
+        "--inject-rate",
+        type=float,
+        default=0.0,
+        help="particles injected at the inlet per second",
+    )
+    parser.add_argument(
+        "--absorb-wall",
+        action="store_true",
+        help="remove particles hitting the biased wall",
+    )
+    parser.add_argument(
+        "--solver",
+        default="spsolve",
+        choices=("spsolve", "multigrid", "mgcg"),
+        help="Poisson solver backend",
+    )
+    parser.add_argument(
+        "--axisymmetric",
+        action="store_true",
+        help="axisymmetric (z, r) run around the bottom edge (boris only)",
+    )
+    parser.add_argument(
+        "--refine",
+        type=int,
+        default=1,
+        help="refine the grid by this factor around the biased wall",
+    )
+    parser.add_argument(
+        "--refine-width",
+        type=float,
+        default=None,
+        help="distance from the wall faces meshed at the finest spacing (m)",
+    )
+    parser.add_argument(
+        "--space-charge",
+        type=float,
+        default=0.0,
+        metavar="WEIGHT",
+        help="self-consistent run with WEIGHT ions per macro-particle "
+        "(per metre depth unless axisymmetric)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="push particles with this many processes over shared memory",
+    )
+    parser.add_argument(
+        "--record-dir", default="recording", help="directory of the trajectory recording"
+    )
+    parser.add_argument(
+        "--stride", type=int, default=1, help="record every stride-th step"
+    )
+    parser.add_argument(
+        "--record-max",
+        type=int,
+        default=None,
+        help="record particles with id below this (default: the initial particles)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=".pic_cache",
+        help="directory caching the solved fields of each geometry",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="always solve the fields"
+    )
+    parser.add_argument(
+        "--subcycle",
+        type=int,
+        default=0,
+        metavar="LEVELS",
+        help="take steps 2**LEVELS times longer, subdivided per particle as needed",
+    )
+    parser.add_argument(
+        "--subcycle-tol",
+        type=float,
+        default=None,
+        help="local position error tolerance of --subcycle, in cells",
+    )
+    parser.add_argument(
+        "--precision",
+        default="float64",
+        choices=("float64", "float32"),
+        help="precision of the particle state and of the fields read by the push",
+    )
+    parser.add_argument(
+        "--sort-every",
+        type=int,
+        default=0,
+        metavar="K",
+        help="reorder the particles by grid cell every K steps",
+    )
+    parser.add_argument(
+        "--sort-order", default="cell", choices=("cell", "morton")
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=0,
+        metavar="N",
+        help="write a checkpoint every N steps",
+    )
+    parser.add_argument(
+        "--checkpoint-dir", default="checkpoints", help="directory of the checkpoints"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="resume from the latest checkpoint in --checkpoint-dir",
+    )
+    parser.add_argument(
+        "--memory", action="store_true", help="print the memory held by the field"
+    )
+    parser.add_argument(
+        "--timing", action="store_true", help="print per-phase timings at the end"
+    )
+    parser.add_argument(
+        "--timing-json", metavar="PATH", help="write per-phase and per-step timings"
+    )
+    parser.add_argument(
+        "--trace", metavar="PATH", help="write a Chrome trace of every phase run"
+    )
+    parser.add_argument(
+        "--profile-steps",
+        metavar="START:STOP",
+        help="run these steps under cProfile, saved to profile.prof",
+    )
+    args = parser.parse_args()
+    method = args.method
+    if args.axisymmetric and method != "boris":
+        parser.error("axisymmetric runs use the boris pusher")
+    if args.subcycle_tol is not None and not args.subcycle:
+        parser.error("--subcycle-tol needs --subcycle LEVELS")
     import numpy as np
 
     np.set_printoptions(threshold=np.inf, edgeitems=30, linewidth=100000)
     import matplotlib.pyplot as plt
 
-    from pic.grid import Grid
-    from pic.field import ElectricField
-    from pic.particle import Particles
-    from pic.integrator import euler, rk4, leapfrog
+    from pic.defaults import GEOMETRY, H, VOLTAGES, make_grid
+    from pic.field import ElectricField, sinusoid
+    from pic.particle import Particles, Injector, Subcycling
     from pic.particle import Q, M
+    from pic.recorder import Recorder, load_recording
+    from pic.checkpoint import latest_checkpoint, restore_checkpoint, save_checkpoint
+    from pic.parallel import SharedMemoryPool
+    from pic.timing import TIMERS
+
+    profile_steps = None
+    if args.profile_steps:
+        start, _, stop = args.profile_steps.partition(":")
+        profile_steps = range(int(start), int(stop or int(start) + 1))
+    if args.timing or args.timing_json or args.trace or profile_steps:
+        TIMERS.enable(trace=bool(args.trace), profile_steps=profile_steps)
 
     # Set up the simulation parameters
     n_particles = 10
     n_steps = 2000
 
-    pusher = {"euler": euler, "rk4": rk4, "leapfrog": leapfrog}[method]
+    pusher = (RZ_PUSHERS if args.axisymmetric else PUSHERS)[method]
+    B = np.array([0.0, 0.0, args.Bz]) if args.Bz else None
+    if args.Bz and args.axisymmetric:
+        # (B_z, B_r, B_theta), along the axis
+        B = np.array([args.Bz, 0.0, 0.0])
     print(f"Using {method} method for integration")
 
-    # Set up grid parameters
-    h = 1e-4
-    length = 0.05
-    height = 0.02
-    h_wall = height / 5
-    w_wall = length / 5
-    x_wall = 0.01
-
-    # Set electric potentials
-    Vin = 1100
-    Vout = -100
-    Vwall = 1000
+    # Grid and electrode voltages of pic.defaults
+    h = H
+    height = GEOMETRY["height"]
     v0 = 100  # initial velocity of the ions (m/s)
 
-    dt = h / np.sqrt(2 * Q * (Vin - Vout) / M)
+    dt = h / np.sqrt(2 * Q * (VOLTAGES["Vin"] - VOLTAGES["Vout"]) / M)
+    subcycling = None
+    if args.subcycle:
+        subcycling = Subcycling(args.subcycle, tol=args.subcycle_tol)
+        # the same run time in fewer, longer steps
+        dt *= 2**args.subcycle
+        n_steps = -(-n_steps // 2**args.subcycle)
     print("dt = ", dt)
 
     # Initialize the objects
-    grid = Grid(h, length, height, h_wall, w_wall, x_wall, Vin, Vout, Vwall)
-    particles = Particles(n_particles, height, v0)
-    fields = ElectricField(grid)
+    grid = make_grid(
+        h,
+        refine=args.refine,
+        refine_width=args.refine_width,
+        axisymmetric=args.axisymmetric,
+    )
+    injector = None
+    if args.inject_rate:
+        injector = Injector(args.inject_rate, height, v0, axisymmetric=args.axisymmetric)
+    particles = Particles(
+        n_particles,
+        height,
+        v0,
+        injector=injector,
+        absorb_wall=args.absorb_wall,
+        subcycling=subcycling,
+        sort_every=args.sort_every,
+        sort_order=args.sort_order,
+        dtype=args.precision,
+        axisymmetric=args.axisymmetric,
+    )
+    waveforms = {}
+    if args.wall_rf:
+        waveforms["Vwall"] = sinusoid(VOLTAGES["Vwall"], *args.wall_rf)
+    fields = ElectricField(
+        grid,
+        solver=args.solver,
+        waveforms=waveforms,
+        space_charge=bool(args.space_charge),
+        cache=None if args.no_cache else args.cache_dir,
+        dtype=args.precision,
+    )
 
-    plt.figure()
-    paths = {}
-    energies = {}
-    for k in range(n_steps):
-        if k == 0:
-            for j in range(n_particles):
-                paths[j] = [np.array(particles.get_position(j))]
-                r = particles.get_position(j)
-                v = particles.get_velocity(j)
-                K = 0.5 * particles.M * np.linalg.norm(v) ** 2
-                U = particles.Q * fields.get_potential_at(r)
-                energies[j] = [K + U]
-
-        particles.push(pusher, fields, dt, grid)
-        for j in range(n_particles):
-            paths[j].append(np.array(particles.get_position(j)))
-            r = particles.get_position(j)
-            v = particles.get_velocity(j)
-            K = 0.5 * particles.M * np.linalg.norm(v) ** 2
-            U = particles.Q * fields.get_potential_at(r)
-            energies[j].append(K + U)
-
-        if r[0] >= length:
+    if args.memory:
+        from pic.memory import format_report
+
+        print(format_report(fields.memory_report(), names=["bytes (MB)"]))
+
+    start = 0
+    resume = None
+    if args.restart:
+        checkpoint = latest_checkpoint(args.checkpoint_dir)
+        if checkpoint is None:
+            parser.error(f"no checkpoint in {args.checkpoint_dir}")
+        state = restore_checkpoint(checkpoint, particles, fields)
+        start = state["step"]
+        resume = state.get("recorder")
+        print(f"Restarting from {checkpoint} at step {start}")
+
+    pool = SharedMemoryPool(fields, grid, args.workers) if args.workers > 1 else None
+    recorder = Recorder(
+        args.record_dir,
+        np.arange(args.record_max or n_particles),
+        stride=args.stride,
+        resume=resume,
+    )
+    if not args.restart:
+        recorder.record(0, 0.0, particles, fields)
+    for k in range(start, n_steps):
+        TIMERS.begin_step(k)
+        fields.update(particles.time)
+        particles.push(pusher, fields, dt, grid, B, pool)
+        if args.space_charge:
+            fields.update_space_charge(
+                particles.positions, particles.Q * args.space_charge
+            )
+        recorder.record(k + 1, particles.time, particles, fields)
+        if args.checkpoint_every and (k + 1) % args.checkpoint_every == 0:
+            save_checkpoint(args.checkpoint_dir, k + 1, particles, recorder, fields)
+        TIMERS.end_step()
+
+        if particles.num == 0 and injector is None:
             break
-        
-    for j in range(n_particles):
-        paths[j] = np.array(paths[j])
-        plt.plot(paths[j][:, 0], paths[j][:, 1], linewidth=3, color="r")
+    recorder.close()
+    if pool is not None:
+        pool.close(particles)
+
+    if TIMERS.enabled:
+        TIMERS.disable()
+        if args.timing:
+            print(TIMERS.summary())
+        if args.timing_json:
+            TIMERS.save_json(args.timing_json)
+        if args.trace:
+            TIMERS.save_trace(args.trace)
+        if profile_steps:
+            print(TIMERS.save_profile("profile.prof"))
+
+    print(f"Absorbed particles: {particles.n_absorbed}")
+    print(f"Particle pushes: {particles.n_pushes}")
+    data = load_recording(args.record_dir)
+    paths = data["positions"]
+    energies = data["energies"]
+
+    plt.figure()
+    for j in range(len(data["ids"])):
+        plt.plot(paths[:, j, 0], paths[:, j, 1], linewidth=3, color="r")
     fields.plot_contour_V(new_fig=False)
     plt.gca().add_patch(
         plt.Rectangle(
@@ -96,9 +320,8 @@ if __name__ == "__main__":
     plt.savefig("potential.png")
 
     plt.figure()
-    for j in range(n_particles):
-        E = energies[j]
-        plt.plot(np.arange(len(E)), E, label=f"particle {j}")
+    for j, pid in enumerate(data["ids"]):
+        plt.plot(data["step"], energies[:, j], label=f"particle {pid}")
         plt.xlabel("step number")
         plt.ylabel("Total Energy")
         plt.legend()
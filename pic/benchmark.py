@@ -0,0 +1,267 @@
+"""Benchmarks of grid assembly, field solve, gather and particle push.
+
+Run as ``python -m pic.benchmark -o bench.json`` to time every stage over a
+range of grid spacings and particle counts. The JSON file holds the timings,
+the fitted scaling exponents and the commit they were measured at, and
+``--compare old.json`` reports the change against an earlier run.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from scipy.sparse.linalg import splu
+
+from . import kernels
+from .defaults import GEOMETRY, make_grid, metadata, scaling_exponent, solve
+from .field import SOLVERS
+from .integrator import PUSHERS
+from .particle import Particles
+
+H_VALUES = (4e-4, 2e-4, 1e-4)
+PARTICLE_COUNTS = (1000, 10000, 100000)
+BENCH_PUSHERS = ("euler", "rk4", "leapfrog", "boris")
+
+
+def _time(func, repeat=3):
+    """Return the best wall-clock time of ``repeat`` calls after a warm-up."""
+    func()
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def random_positions(n, seed=0):
+    """Return n positions spread uniformly over the domain."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack(
+        (
+            rng.uniform(0, 0.9 * GEOMETRY["length"], n),
+            rng.uniform(0, GEOMETRY["height"], n),
+        )
+    )
+
+
+def bench_grid(h_values=H_VALUES, solver="spsolve", repeat=3):
+    """
+    Time Laplacian assembly, potential solve and gradient for each spacing.
+
+    Returns:
+        list: Records with ``h``, ``nodes`` and the times of ``laplacian``,
+            ``solve_V`` (including the factorization) and ``solve_E``.
+    """
+    records = []
+    for h in h_values:
+        grid = make_grid(h)
+        field, _ = solve(grid, solver=solver)
+
+        if solver == "spsolve":
+            # the field freed A once factored; time the factorization and
+            # solve on an operator assembled beforehand, as in a run
+            A = grid.get_A().tocsc()
+            b = grid.get_b()
+
+            def solve_V():
+                splu(A).solve(b)
+
+        else:
+
+            def solve_V():
+                field._linear_solver = None
+                field.solve_V()
+
+        records.append(
+            {
+                "h": h,
+                "nodes": grid.Nx * grid.Ny,
+                "laplacian": _time(grid.get_laplacian, repeat),
+                "solve_V": _time(solve_V, repeat),
+                "solve_E": _time(field.solve_E, repeat),
+            }
+        )
+    return records
+
+
+def bench_particles(
+    counts=PARTICLE_COUNTS, pushers=BENCH_PUSHERS, h=H_VALUES[-1], repeat=3
+):
+    """
+    Time the field gather and one push of every pusher for each particle count.
+
+    Pushes run on the NumPy backend and, when numba is installed, also on
+    the compiled kernel for the pushers it supports.
+
+    Returns:
+        list: Records with ``stage`` ("gather" or "push"), ``n`` and ``time``,
+            plus ``pusher`` and ``backend`` for pushes.
+    """
+    grid = make_grid(h)
+    field, _ = solve(grid)
+    backends = ["numpy"]
+    if kernels.available():
+        backends.append("numba")
+
+    records = []
+    for n in counts:
+        positions = random_positions(n)
+        records.append(
+            {"stage": "gather", "n": n, "time": _time(lambda: field.gather(positions), repeat)}
+        )
+        for name in pushers:
+            pusher = PUSHERS[name]
+            for backend in backends:
+                if backend == "numba" and not kernels.supports(pusher, None):
+                    continue
+                particles = Particles(n, grid.height, backend=backend)
+                particles.positions[:] = positions
+                dt = grid.h / 5e4
+                records.append(
+                    {
+                        "stage": "push",
+                        "pusher": name,
+                        "backend": backend,
+                        "n": n,
+                        "time": _time(
+                            lambda: particles.push(pusher, field, dt, grid), repeat
+                        ),
+                    }
+                )
+    return records
+
+
+def scaling(grid_records, particle_records):
+    """
+    Return the scaling curves and their fitted exponents.
+
+    Returns:
+        dict: For each stage, ``size`` (nodes or particles), ``time`` and the
+            ``exponent`` of time against size.
+    """
+    curves = {}
+    for key in ("laplacian", "solve_V", "solve_E"):
+        curves[key] = {
+            "size": [r["nodes"] for r in grid_records],
+            "time": [r[key] for r in grid_records],
+        }
+    groups = {}
+    for r in particle_records:
+        key = r["stage"] if r["stage"] == "gather" else f"push_{r['pusher']}_{r['backend']}"
+        groups.setdefault(key, []).append(r)
+    for key, records in groups.items():
+        curves[key] = {
+            "size": [r["n"] for r in records],
+            "time": [r["time"] for r in records],
+        }
+    for curve in curves.values():
+        curve["exponent"] = scaling_exponent(curve["size"], curve["time"])
+    return curves
+
+
+def run(
+    h_values=H_VALUES,
+    counts=PARTICLE_COUNTS,
+    pushers=BENCH_PUSHERS,
+    solver="spsolve",
+    repeat=3,
+):
+    """Run all benchmarks and return the results as a JSON-serializable dict."""
+    grid_records = bench_grid(h_values, solver, repeat)
+    particle_records = bench_particles(counts, pushers, h_values[-1], repeat)
+    return {
+        "meta": metadata(),
+        "solver": solver,
+        "repeat": repeat,
+        "grid": grid_records,
+        "particles": particle_records,
+        "scaling": scaling(grid_records, particle_records),
+    }
+
+
+def compare(baseline, results):
+    """
+    Compare the times of two benchmark runs point by point.
+
+    Returns:
+        list: (stage, size, baseline time, new time, ratio) for every point
+            present in both runs.
+    """
+    rows = []
+    for stage, curve in results["scaling"].items():
+        old = baseline["scaling"].get(stage)
+        if old is None:
+            continue
+        old_times = dict(zip(old["size"], old["time"]))
+        for size, t in zip(curve["size"], curve["time"]):
+            if size in old_times:
+                rows.append((stage, size, old_times[size], t, t / old_times[size]))
+    return rows
+
+
+def print_scaling(results):
+    """Print the scaling table of a benchmark run."""
+    print(f"{'stage':<24}{'exponent':>10}  time (s) by size")
+    for stage, curve in results["scaling"].items():
+        points = ", ".join(f"{s}: {t:.3g}" for s, t in zip(curve["size"], curve["time"]))
+        print(f"{stage:<24}{curve['exponent']:>10.2f}  {points}")
+
+
+def plot_scaling(results, path):
+    """Save log-log plots of time against nodes and against particles."""
+    import matplotlib.pyplot as plt
+
+    fig, (ax_grid, ax_particles) = plt.subplots(1, 2, figsize=(12, 5))
+    for stage, curve in results["scaling"].items():
+        ax = ax_grid if stage in ("laplacian", "solve_V", "solve_E") else ax_particles
+        ax.loglog(curve["size"], curve["time"], "o-", label=stage)
+    ax_grid.set_xlabel("grid nodes")
+    ax_particles.set_xlabel("particles")
+    for ax in (ax_grid, ax_particles):
+        ax.set_ylabel("time (s)")
+        ax.legend(fontsize="small")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m pic.benchmark")
+    parser.add_argument("-o", "--output", default="benchmark.json")
+    parser.add_argument(
+        "--h", type=float, nargs="+", default=list(H_VALUES), help="grid spacings"
+    )
+    parser.add_argument(
+        "--particles", type=int, nargs="+", default=list(PARTICLE_COUNTS),
+        help="particle counts",
+    )
+    parser.add_argument(
+        "--pushers", nargs="+", default=list(BENCH_PUSHERS), choices=sorted(PUSHERS)
+    )
+    parser.add_argument("--solver", default="spsolve", choices=SOLVERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier benchmark JSON")
+    parser.add_argument("--plot", metavar="PNG", help="save the scaling curves")
+    args = parser.parse_args()
+
+    results = run(
+        sorted(args.h, reverse=True),
+        sorted(args.particles),
+        args.pushers,
+        args.solver,
+        args.repeat,
+    )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_scaling(results)
+    print(f"Results written to {args.output}")
+
+    if args.plot:
+        plot_scaling(results, args.plot)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nChange against {baseline['meta']['commit']}:")
+        for stage, size, old, new, ratio in compare(baseline, results):
+            print(f"{stage:<24}{size:>10}{old:>12.3g}{new:>12.3g}{ratio:>8.2f}x")
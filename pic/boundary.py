@@ -0,0 +1,151 @@
+"""Collision of particle paths with the domain edges and the biased wall.
+
+The path of a particle over a step is taken as the straight segment from
+its old to its new position. The first boundary the segment crosses is
+found exactly; the particle is reflected there, the rest of the segment
+is mirrored, and the search repeats for the reflected segment. This keeps
+reflections correct at steps that cross several cells, where looking only
+at the end point can pass through a corner of the wall or pick the wrong
+face.
+"""
+
+import numpy as np
+
+# Reflections followed within one step; a particle still hitting a boundary
+# after that many stops at the hit point.
+MAX_BOUNCES = 4
+
+# Faces, in the order ties are broken
+TOP, BOTTOM, WALL_TOP, WALL_LEFT, WALL_RIGHT, OUTLET, INLET = range(7)
+
+
+def first_hits(x0, y0, x1, y1, grid):
+    """
+    Find the first boundary crossed by each segment.
+
+    Args:
+        x0, y0, x1, y1 (numpy.ndarray): Start and end points of the segments.
+        grid (Grid): Grid class.
+
+    Returns:
+        tuple: The fraction of each segment at which it hits (inf if it
+            does not hit anything) and the face hit.
+    """
+    x_wall = grid.x_wall
+    wall_end = grid.x_wall + grid.w_wall
+    h_wall = grid.h_wall
+    dx = x1 - x0
+    dy = y1 - y0
+    inf = np.inf
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_top = np.where(dy > 0, (grid.height - y0) / dy, inf)
+
+        t_bottom = np.where(dy < 0, (0.0 - y0) / dy, inf)
+        x_at = x0 + t_bottom * dx
+        t_bottom[(x_at > x_wall) & (x_at < wall_end)] = inf
+
+        t_wall_top = np.where((dy < 0) & (y0 >= h_wall), (h_wall - y0) / dy, inf)
+        x_at = x0 + t_wall_top * dx
+        t_wall_top[(x_at < x_wall) | (x_at > wall_end)] = inf
+
+        t_left = np.where((dx > 0) & (x0 <= x_wall), (x_wall - x0) / dx, inf)
+        t_left[y0 + t_left * dy > h_wall] = inf
+
+        t_right = np.where((dx < 0) & (x0 >= wall_end), (wall_end - x0) / dx, inf)
+        t_right[y0 + t_right * dy > h_wall] = inf
+
+        t_outlet = np.where(dx > 0, (grid.length - x0) / dx, inf)
+
+        t_inlet = np.where(dx < 0, (0.0 - x0) / dx, inf)
+
+    t = np.stack((t_top, t_bottom, t_wall_top, t_left, t_right, t_outlet, t_inlet))
+    t[(t < 0) | (t > 1)] = inf
+    face = np.argmin(t, axis=0)
+    return t[face, np.arange(len(x0))], face
+
+
+def collide(start, end, velocities, grid, wall_points=None):
+    """
+    Apply the boundaries to the paths of the particles over a step.
+
+    Particles are reflected specularly at the top and bottom of the domain
+    and at the faces of the biased wall, and stop where they cross the
+    outlet or return through the inlet.
+
+    Args:
+        start (numpy.ndarray): (N, 2) positions at the start of the step.
+        end (numpy.ndarray): (N, 2) positions at the end of the step before
+            the boundaries, updated in place.
+        velocities (numpy.ndarray): (N, 2) velocities at the end of the step,
+            updated in place.
+        grid (Grid): Grid class.
+        wall_points (numpy.ndarray): Optional (N, 2) array, set for the
+            particles hitting the wall to the point of their first hit.
+
+    Returns:
+        tuple: Boolean masks of the particles that reached the outlet, of
+            those that hit the biased wall and of those that left through
+            the inlet.
+    """
+    n = len(start)
+    right_boundary = np.zeros(n, dtype=bool)
+    wall = np.zeros(n, dtype=bool)
+    inlet = np.zeros(n, dtype=bool)
+    x_wall = grid.x_wall
+    wall_end = grid.x_wall + grid.w_wall
+    # coordinate of each face along its normal, and the normal axis
+    plane = np.array([grid.height, 0.0, grid.h_wall, x_wall, wall_end, grid.length, 0.0])
+    axis = np.array([1, 1, 1, 0, 0, 0, 0])
+
+    # only segments whose bounding box reaches a boundary can hit one
+    x0, y0 = start[:, 0], start[:, 1]
+    x1, y1 = end[:, 0], end[:, 1]
+    x_lo, x_hi = np.minimum(x0, x1), np.maximum(x0, x1)
+    y_lo, y_hi = np.minimum(y0, y1), np.maximum(y0, y1)
+    near = (y_hi >= grid.height) | (y_lo <= 0) | (x_hi >= grid.length) | (x_lo <= 0)
+    near |= (x_lo <= wall_end) & (x_hi >= x_wall) & (y_lo <= grid.h_wall)
+
+    idx = np.flatnonzero(near)
+    x0 = x0[idx]
+    y0 = y0[idx]
+    for bounce in range(MAX_BOUNCES + 1):
+        x1 = end[idx, 0]
+        y1 = end[idx, 1]
+        t, face = first_hits(x0, y0, x1, y1, grid)
+        hit = t <= 1
+        if not hit.any():
+            break
+        idx, t, face = idx[hit], t[hit], face[hit]
+        x0, y0, x1, y1 = x0[hit], y0[hit], x1[hit], y1[hit]
+        px = x0 + t * (x1 - x0)
+        py = y0 + t * (y1 - y0)
+        c = plane[face]
+        on_x = axis[face] == 0
+        px[on_x] = c[on_x]
+        py[~on_x] = c[~on_x]
+
+        out = (face == OUTLET) | (face == INLET)
+        right_boundary[idx[face == OUTLET]] = True
+        inlet[idx[face == INLET]] = True
+        on_wall = (face >= WALL_TOP) & (face <= WALL_RIGHT)
+        if wall_points is not None:
+            first = on_wall & ~wall[idx]
+            wall_points[idx[first], 0] = px[first]
+            wall_points[idx[first], 1] = py[first]
+        wall[idx[on_wall]] = True
+
+        # mirror the rest of the segment and the velocity in the face
+        x1 = np.where(on_x, 2 * c - x1, x1)
+        y1 = np.where(on_x, y1, 2 * c - y1)
+        reflect = ~out
+        velocities[idx[reflect], np.where(on_x, 0, 1)[reflect]] *= -1
+        if bounce == MAX_BOUNCES:
+            x1, y1 = px, py
+        x1[out] = px[out]
+        y1[out] = py[out]
+        end[idx, 0] = x1
+        end[idx, 1] = y1
+
+        keep = ~out
+        idx, x0, y0 = idx[keep], px[keep], py[keep]
+    return right_boundary, wall, inlet
@@ -0,0 +1,128 @@
+"""Content-addressed on-disk cache of solved field arrays.
+
+Each entry is a directory named after the SHA-256 of the parameters that
+produced it, holding one ``.npy`` file per array. Entries are written to a
+temporary directory and renamed into place, so concurrent processes only
+ever see complete entries; when two processes solve the same entry, the
+first rename wins and the other copy is discarded. Loaded arrays are
+memory-mapped read-only, so reading an entry costs almost nothing.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Bump when the layout or meaning of the cached arrays changes
+CACHE_VERSION = 1
+
+
+class FieldCache:
+    """Directory of cached arrays with size-based least recently used eviction."""
+
+    def __init__(self, directory, max_bytes=2**30):
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str): Cache directory, created if needed.
+            max_bytes (int): Total size above which the least recently used
+                entries are deleted when a new entry is stored.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(**params):
+        """Return the hex digest identifying a set of JSON-serializable parameters."""
+        params = dict(params, cache_version=CACHE_VERSION)
+        text = json.dumps(params, sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        """
+        Map the arrays of an entry.
+
+        Returns:
+            dict: Read-only memory-mapped arrays by name, or None if the
+                entry is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            names = sorted(f for f in os.listdir(path) if f.endswith(".npy"))
+            arrays = {f[:-4]: np.load(os.path.join(path, f), mmap_mode="r") for f in names}
+            # the modification time of an entry is its last use
+            os.utime(path)
+        except (FileNotFoundError, NotADirectoryError):
+            # missing, or evicted by another process while being read
+            return None
+        return arrays
+
+    def store(self, key, arrays):
+        """
+        Save arrays as an entry and evict old entries beyond ``max_bytes``.
+
+        Args:
+            key (str): Entry key from ``key``.
+            arrays (dict): Arrays by name.
+        """
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(arr))
+            os.rename(tmp, self._path(key))
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(self._path(key)):
+                raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """Return (last use, size in bytes, key) of every entry, oldest first."""
+        out = []
+        for key in os.listdir(self.directory):
+            path = self._path(key)
+            if key.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(path))
+                out.append((os.stat(path).st_mtime, size, key))
+            except FileNotFoundError:
+                continue
+        return sorted(out)
+
+    def evict(self, keep=None):
+        """Delete the least recently used entries until the cache fits ``max_bytes``."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key):
+        """Delete an entry, renaming it first so no reader sees it half deleted."""
+        trash = os.path.join(self.directory, f".trash-{key}-{os.getpid()}-{time.monotonic_ns()}")
+        try:
+            os.rename(self._path(key), trash)
+        except FileNotFoundError:
+            return
+        # arrays still mapped by other processes stay readable until unmapped
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def clear(self):
+        """Delete every entry."""
+        for _, _, key in self.entries():
+            self._remove(key)
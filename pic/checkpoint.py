@@ -0,0 +1,169 @@
+"""Checkpoint and restart of a simulation run.
+
+A checkpoint is a directory ``checkpoint_XXXXXXXXX`` (the step number)
+holding the live particle arrays as ``.npy`` files and the scalar state
+(step, time, counters, injector random state, recorder offsets) in
+``state.json``. It is written to a temporary directory and renamed into
+place, so an interrupted write never replaces a complete checkpoint, and
+its arrays are memory-mapped when it is restored.
+"""
+
+import glob
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Bump when the checkpoint layout changes
+CHECKPOINT_VERSION = 2
+
+
+def _name(step):
+    return f"checkpoint_{step:09d}"
+
+
+def list_checkpoints(directory):
+    """Return the paths of the checkpoints in a directory, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, "checkpoint_" + "[0-9]" * 9)))
+
+
+def latest_checkpoint(directory):
+    """Return the path of the most recent checkpoint, or None."""
+    paths = list_checkpoints(directory)
+    return paths[-1] if paths else None
+
+
+def save_checkpoint(
+    directory, step, particles, recorder=None, electric_field=None, keep=2
+):
+    """
+    Write a checkpoint of the run after ``step`` steps.
+
+    The recorder is synced first, so its files on disk match the offsets
+    saved in the checkpoint.
+
+    Args:
+        directory (str): Checkpoint directory, created if needed.
+        step (int): Number of steps completed.
+        particles (Particles): Particle collection.
+        recorder (Recorder): Optional recorder of the run.
+        electric_field (ElectricField): Optional field, whose electrode
+            voltages and space charge potential are saved.
+        keep (int): Number of most recent checkpoints to keep.
+
+    Returns:
+        str: Path of the checkpoint.
+    """
+    os.makedirs(directory, exist_ok=True)
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "step": step,
+        "num": int(particles.num),
+        "time": particles.time,
+        "n_injected": int(particles.n_injected),
+        "n_absorbed": particles.n_absorbed,
+        "n_wall_hits": int(particles.n_wall_hits),
+        "n_pushes": int(particles.n_pushes),
+        "n_steps": int(particles.n_steps),
+    }
+    if particles.injector is not None:
+        state["injector"] = {
+            "rng": particles.injector.rng.bit_generator.state,
+            "carry": particles.injector._carry,
+        }
+    if recorder is not None:
+        recorder.sync()
+        state["recorder"] = recorder.state()
+    arrays = {
+        "positions": particles.positions,
+        "velocities": particles.velocities,
+        "ids": particles.ids,
+    }
+    if electric_field is not None:
+        state["voltages"] = electric_field.voltages.tolist()
+        if electric_field._space_charge is not None:
+            arrays["space_charge"] = electric_field._space_charge[0]
+
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=directory)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+    with open(os.path.join(tmp, "state.json"), "w") as f:
+        json.dump(state, f)
+    path = os.path.join(directory, _name(step))
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp, path)
+
+    for old in list_checkpoints(directory)[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint.
+
+    Returns:
+        tuple: The state dict and a dict of read-only memory-mapped arrays.
+    """
+    with open(os.path.join(path, "state.json")) as f:
+        state = json.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}.")
+    arrays = {
+        os.path.basename(f)[:-4]: np.load(f, mmap_mode="r")
+        for f in glob.glob(os.path.join(path, "*.npy"))
+    }
+    return state, arrays
+
+
+def restore_checkpoint(path, particles, electric_field=None):
+    """
+    Restore a run from a checkpoint into freshly constructed objects.
+
+    Args:
+        path (str): Checkpoint directory.
+        particles (Particles): Particle collection set up as for the original
+            run (same injector settings), whose state is replaced.
+        electric_field (ElectricField): Optional field, whose voltages and
+            space charge are restored.
+
+    Returns:
+        dict: The checkpoint state. ``state["step"]`` is the number of
+            completed steps and ``state.get("recorder")`` the offsets to pass
+            to ``Recorder(..., resume=...)``.
+    """
+    state, arrays = load_checkpoint(path)
+    num = state["num"]
+    capacity = max(num, len(particles._ids))
+    for name in ("_positions", "_velocities"):
+        old = getattr(particles, name)
+        setattr(particles, name, np.zeros((capacity,) + old.shape[1:], dtype=old.dtype))
+    particles._ids = np.zeros(capacity, dtype=np.int64)
+    particles.num = num
+    particles.positions[:] = arrays["positions"]
+    particles.velocities[:] = arrays["velocities"]
+    particles.ids[:] = arrays["ids"]
+    particles.time = state["time"]
+    particles.n_injected = state["n_injected"]
+    particles.n_absorbed = dict(state["n_absorbed"])
+    particles.n_wall_hits = state["n_wall_hits"]
+    particles.n_pushes = state["n_pushes"]
+    particles.n_steps = state["n_steps"]
+
+    if "injector" in state:
+        if particles.injector is None:
+            raise ValueError("The checkpoint was written with an injector.")
+        particles.injector.rng.bit_generator.state = state["injector"]["rng"]
+        particles.injector._carry = state["injector"]["carry"]
+
+    if electric_field is not None:
+        if "voltages" in state:
+            electric_field.set_voltages(*state["voltages"])
+        if "space_charge" in arrays:
+            V = np.array(arrays["space_charge"])
+            electric_field._space_charge = (V,) + electric_field.solve_E(V)
+            electric_field._update_fields()
+    return state
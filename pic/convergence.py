@@ -0,0 +1,417 @@
+"""Accuracy against cost of every pusher over grid spacings and time steps.
+
+Run as ``python -m pic.convergence -o convergence.json`` to push particles
+through a potential well with an exact solution, for every pusher of
+``pic.integrator`` on each grid spacing ``--h`` and number of steps per
+oscillation period ``--steps``. Each case reports the position error against
+the exact trajectories, the drift of the total energy K + U (as recorded by
+``python -m pic``) and its CPU and wall-clock time. ``--plot`` saves the
+error against CPU seconds curves and ``--target`` prints the cheapest
+pusher, spacing and step meeting a position error.
+
+The well is -V0 (cos kx (x - xc) + cos ky (y - yc)): each coordinate of a
+particle released at rest swings as a pendulum, known in closed form through
+Jacobi elliptic functions. It is sampled on the grid nodes and differentiated
+and interpolated like a solved field, so the error shrinks with both h and dt.
+It sits above the biased wall, clear of every boundary.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from scipy.special import ellipj, ellipk
+
+from .defaults import make_grid, metadata, scaling_exponent, solve
+from .integrator import PUSHERS
+from .particle import M, Q, advance
+
+H_VALUES = (4e-4, 2e-4, 1e-4)
+STEPS_PER_PERIOD = (20, 40, 80, 160, 320)
+WELL_VOLTAGE = 100.0
+N_PERIODS = 2
+
+
+class PendulumWell:
+    """Separable potential well above the biased wall and its exact trajectories."""
+
+    def __init__(self, grid, V0=WELL_VOLTAGE):
+        """
+        Fit the well to the free part of a grid.
+
+        In x the well spans the whole length; in y it spans the height above
+        the wall, so particles swinging up to pi / 2 in y never reach it.
+
+        Args:
+            grid (Grid): Grid the well is sampled on.
+            V0 (float): Depth of the well along each axis (V).
+        """
+        self.V0 = V0
+        self.k = np.array([2 * np.pi / grid.length, np.pi / (grid.height - grid.h_wall)])
+        self.center = np.array([grid.length / 2, (grid.height + grid.h_wall) / 2])
+        # small oscillation angular frequency along each axis
+        self.omega = self.k * np.sqrt(Q / M * V0)
+
+    def potential(self, x, y):
+        """Return the potential (V) at positions x, y."""
+        return -self.V0 * (
+            np.cos(self.k[0] * (x - self.center[0]))
+            + np.cos(self.k[1] * (y - self.center[1]))
+        )
+
+    def period(self):
+        """Return the shortest small oscillation period (s)."""
+        return 2 * np.pi / self.omega.max()
+
+    def start(self, angles):
+        """Return the positions of particles released at rest at (N, 2) phase angles."""
+        return self.center + angles / self.k
+
+    def exact(self, angles, t):
+        """
+        Return the exact positions and velocities at time t.
+
+        A pendulum released at rest at angle a is at
+        2 arcsin(s cd(w t | s**2)) with s = sin(a / 2), moving at
+        -2 s w cn(K - w t | s**2).
+
+        Args:
+            angles (numpy.ndarray): (N, 2) phase angles k (x - xc) at release.
+            t (float): Time since release (s).
+
+        Returns:
+            tuple: (N, 2) positions and velocities.
+        """
+        s = np.sin(angles / 2)
+        m = s**2
+        sn, cn, _, _ = ellipj(ellipk(m) - self.omega * t, m)
+        theta = 2 * np.arcsin(s * sn)
+        return self.start(theta), -2 * s * self.omega * cn / self.k
+
+
+def sample_well(field, well):
+    """Replace the potential and fields of an ElectricField by the sampled well."""
+    V = well.potential(field.grid.Xs, field.grid.Ys)
+    field._laplace = [V, *field.solve_E(V)]
+    field._update_fields()
+
+
+def well_angles(n):
+    """Return (n, 2) release angles from small to large swings."""
+    return np.column_stack((np.linspace(0.3, 2.4, n), np.linspace(1.2, 0.2, n)))
+
+
+def total_energy(positions, velocities, field):
+    """Return the kinetic plus potential energy of each particle (eV)."""
+    _, V = field.gather(positions, potential=True)
+    return 0.5 * M * np.einsum("ij,ij->i", velocities, velocities) / Q + V
+
+
+def run_case(field, well, pusher, steps_per_period, n_particles, n_periods, backend):
+    """
+    Push particles through the sampled well with one pusher and time step.
+
+    Only the pushes are timed; the energy is evaluated after every step.
+
+    Returns:
+        dict: ``dt``, the RMS and maximum position error (m) against the exact
+            trajectories at the end, the largest drift of the total energy
+            over the run relative to V0, whether any particle ``escaped``
+            the well through a boundary, the ``cpu`` and ``wall`` time (s)
+            of the pushes and the final ``positions``.
+    """
+    grid = field.grid
+    dt = well.period() / steps_per_period
+    n_steps = steps_per_period * n_periods
+    angles = well_angles(n_particles)
+    positions = well.start(angles)
+    velocities = np.zeros_like(positions)
+    energy0 = total_energy(positions, velocities, field)
+
+    # compile or warm up outside the timed loop
+    x, v = positions.copy(), velocities.copy()
+    advance(x, v, pusher, field, Q / M, dt, grid, backend=backend)
+
+    drift = 0.0
+    escaped = False
+    cpu = wall = 0.0
+    for _ in range(n_steps):
+        c0, w0 = time.process_time(), time.perf_counter()
+        outlet, hit, inlet = advance(
+            positions, velocities, pusher, field, Q / M, dt, grid, backend=backend
+        )
+        cpu += time.process_time() - c0
+        wall += time.perf_counter() - w0
+        escaped |= bool(outlet.any() or hit.any() or inlet.any())
+        energy = total_energy(positions, velocities, field)
+        drift = max(drift, float(np.abs(energy - energy0).max()) / well.V0)
+
+    x_exact, _ = well.exact(angles, n_steps * dt)
+    error = np.sqrt(np.sum((positions - x_exact) ** 2, axis=1))
+    if escaped or not np.isfinite(error).all():
+        error = np.full(len(error), np.inf)
+    return {
+        "dt": dt,
+        "rms_error": float(np.sqrt(np.mean(error**2))),
+        "max_error": float(error.max()),
+        "drift": drift,
+        "escaped": escaped,
+        "cpu": cpu,
+        "wall": wall,
+        "positions": positions,
+    }
+
+
+def convergence_order(sizes, errors):
+    """
+    Return the slope of log(error) against log(step size).
+
+    Only the points whose error is at least twice the smallest of the curve
+    are fitted, where the error is dominated by the step size varied rather
+    than by the other one; nan if fewer than two are left.
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    errors = np.asarray(errors, dtype=float)
+    keep = np.isfinite(errors) & (errors >= 2 * errors.min())
+    return scaling_exponent(sizes[keep], errors[keep])
+
+
+def self_convergence_order(sizes, positions):
+    """
+    Return the order from the changes between runs of successive step sizes.
+
+    The final positions of runs with step sizes h_i and h_i+1 differ by
+    about C h_i**p, plus the error in the step size held fixed, which is
+    the same in both runs and cancels. From three sizes the order is the
+    slope of the two differences. With more, they are fitted like
+    ``convergence_order``, dropping those at the round-off and
+    interpolation floor that rk4 reaches in dt.
+
+    Args:
+        sizes (list): Step sizes, from the largest.
+        positions (list): (N, 2) final positions of the run of each size.
+    """
+    changes = [
+        np.sqrt(np.mean(np.sum((a - b) ** 2, axis=1)))
+        for a, b in zip(positions[:-1], positions[1:])
+    ]
+    if len(changes) == 2 and np.all(np.isfinite(changes)):
+        return scaling_exponent(sizes[:-1], changes)
+    return convergence_order(sizes[:-1], changes)
+
+
+def run(
+    h_values=H_VALUES,
+    steps=STEPS_PER_PERIOD,
+    pushers=tuple(PUSHERS),
+    n_particles=100,
+    n_periods=N_PERIODS,
+    backend="auto",
+):
+    """
+    Run every pusher, spacing and step and return the results as a JSON-serializable dict.
+
+    The field of ``python -m pic`` is solved on each grid first: its time is
+    the ``field_cpu`` and ``field_wall`` every run at that spacing pays, and
+    ``cost`` is that plus the CPU time of the pushes.
+
+    Returns:
+        dict: ``meta`` as in ``pic.benchmark``, the ``cases``, for each
+            pusher and spacing the ``curves`` of cost, error and drift over
+            the steps with the ``order`` of the error in dt, and for each
+            pusher the ``orders`` in dt on the finest grid and in h at the
+            smallest step. These come from ``self_convergence_order``, as
+            the error against the exact solution at the finest grid is
+            often limited by dt, and for rk4 by h at every step.
+    """
+    h_values = sorted(h_values, reverse=True)
+    steps = sorted(steps)
+    cases = []
+    final = {}
+    for h in h_values:
+        grid = make_grid(h)
+        c0 = time.process_time()
+        field, field_wall = solve(grid)
+        field_cpu = time.process_time() - c0
+        well = PendulumWell(grid)
+        sample_well(field, well)
+        for name in pushers:
+            for steps_per_period in steps:
+                case = run_case(
+                    field,
+                    well,
+                    PUSHERS[name],
+                    steps_per_period,
+                    n_particles,
+                    n_periods,
+                    backend,
+                )
+                final[name, h, steps_per_period] = case.pop("positions")
+                case.update(
+                    pusher=name,
+                    h=h,
+                    steps_per_period=steps_per_period,
+                    field_cpu=field_cpu,
+                    field_wall=field_wall,
+                    cost=field_cpu + case["cpu"],
+                )
+                cases.append(case)
+
+    curves = {}
+    for case in cases:
+        curve = curves.setdefault(
+            f"{case['pusher']}_h{case['h']:g}", {"pusher": case["pusher"], "h": case["h"]}
+        )
+        for key in ("dt", "cost", "rms_error", "drift"):
+            curve.setdefault(key, []).append(case[key])
+    for curve in curves.values():
+        curve["order"] = convergence_order(curve["dt"], curve["rms_error"])
+    orders = {}
+    for name in pushers:
+        h, s = h_values[-1], steps[-1]
+        orders[name] = {
+            "dt": self_convergence_order(
+                [1 / n for n in steps], [final[name, h, n] for n in steps]
+            ),
+            "h": self_convergence_order(h_values, [final[name, x, s] for x in h_values]),
+        }
+    return {
+        "meta": metadata(),
+        "well_voltage": WELL_VOLTAGE,
+        "particles": n_particles,
+        "periods": n_periods,
+        "backend": backend,
+        "cases": cases,
+        "curves": curves,
+        "orders": orders,
+    }
+
+
+def cheapest(results, target, drift=None, particles=None):
+    """
+    Return the case of lowest cost meeting an accuracy target.
+
+    Args:
+        results (dict): Output of ``run``.
+        target (float): Largest RMS position error (m).
+        drift (float): Optional largest energy drift relative to V0.
+        particles (int): Price the pushes for this many particles instead of
+            those of the study, as the push time grows with their number
+            while the field solve does not.
+
+    Returns:
+        dict: The case with its ``cost``, or None if no case meets the target.
+    """
+    scale = 1.0 if particles is None else particles / results["particles"]
+    ok = [
+        dict(c, cost=c["field_cpu"] + scale * c["cpu"])
+        for c in results["cases"]
+        if c["rms_error"] <= target and (drift is None or c["drift"] <= drift)
+    ]
+    return min(ok, key=lambda c: c["cost"]) if ok else None
+
+
+def print_cases(results):
+    """Print the error, drift and time of every case."""
+    print(
+        f"{'pusher':<16}{'h':>8}{'steps':>7}{'rms error':>11}{'drift':>10}"
+        f"{'push (s)':>10}{'cost (s)':>10}"
+    )
+    for c in results["cases"]:
+        print(
+            f"{c['pusher']:<16}{c['h']:>8.0e}{c['steps_per_period']:>7}"
+            f"{c['rms_error']:>11.2e}{c['drift']:>10.2e}{c['cpu']:>10.3f}"
+            f"{c['cost']:>10.3f}"
+        )
+    print(f"\n{'pusher':<16}{'order in dt':>12}{'order in h':>12}")
+    for name, order in results["orders"].items():
+        print(f"{name:<16}{order['dt']:>12.2f}{order['h']:>12.2f}")
+
+
+def plot_curves(results, path):
+    """Save log-log plots of the error and the energy drift against CPU seconds."""
+    import matplotlib.pyplot as plt
+
+    fig, (ax_error, ax_drift) = plt.subplots(1, 2, figsize=(12, 5))
+    pushers = list(results["orders"])
+    spacings = sorted({c["h"] for c in results["cases"]}, reverse=True)
+    for key, curve in results["curves"].items():
+        # one colour per pusher, one marker per spacing
+        style = dict(
+            color=f"C{pushers.index(curve['pusher']) % 10}",
+            marker="os^vDx"[spacings.index(curve["h"]) % 6],
+            label=key,
+        )
+        ax_error.loglog(curve["cost"], curve["rms_error"], **style)
+        ax_drift.loglog(curve["cost"], curve["drift"], **style)
+    ax_error.set_ylabel("RMS position error (m)")
+    ax_drift.set_ylabel("energy drift / V0")
+    for ax in (ax_error, ax_drift):
+        ax.set_xlabel("CPU time (s)")
+        ax.xaxis.set_minor_formatter(plt.NullFormatter())
+        ax.legend(fontsize="x-small", ncol=2)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m pic.convergence")
+    parser.add_argument("-o", "--output", default="convergence.json")
+    parser.add_argument(
+        "--h", type=float, nargs="+", default=list(H_VALUES), help="grid spacings"
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        nargs="+",
+        default=list(STEPS_PER_PERIOD),
+        help="time steps per oscillation period",
+    )
+    parser.add_argument(
+        "--pushers", nargs="+", default=list(PUSHERS), choices=sorted(PUSHERS)
+    )
+    parser.add_argument("--particles", type=int, default=100)
+    parser.add_argument("--periods", type=int, default=N_PERIODS)
+    parser.add_argument("--backend", default="auto", choices=("auto", "numpy", "numba"))
+    parser.add_argument(
+        "--plot", metavar="PNG", help="save the error against cost curves"
+    )
+    parser.add_argument(
+        "--target", type=float, help="print the cheapest case with this RMS error (m)"
+    )
+    parser.add_argument(
+        "--target-drift", type=float, help="and at most this energy drift / V0"
+    )
+    parser.add_argument(
+        "--run-particles",
+        type=int,
+        help="price the pushes of --target for a run of this many particles",
+    )
+    args = parser.parse_args()
+
+    results = run(
+        sorted(args.h, reverse=True),
+        sorted(args.steps),
+        args.pushers,
+        args.particles,
+        args.periods,
+        args.backend,
+    )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_cases(results)
+    print(f"Results written to {args.output}")
+
+    if args.plot:
+        plot_curves(results, args.plot)
+    if args.target is not None:
+        best = cheapest(results, args.target, args.target_drift, args.run_particles)
+        if best is None:
+            print(f"No case reaches an RMS error of {args.target:g} m")
+        else:
+            print(
+                f"Cheapest: {best['pusher']} with h = {best['h']:g} and "
+                f"{best['steps_per_period']} steps per period "
+                f"(dt = {best['dt']:.3g} s, {best['cost']:.3f} CPU s)"
+            )
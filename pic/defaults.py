@@ -0,0 +1,89 @@
+"""The case of ``python -m pic`` and helpers shared by the diagnostic scripts.
+
+The benchmark, convergence, refinement, precision, memory, statistics and
+sweep scripts all run on this geometry, so it is defined once here together
+with the grid and field factories and the run metadata they record.
+"""
+
+import datetime
+import platform
+import subprocess
+import time
+
+import numpy as np
+import scipy
+
+from . import kernels
+from .field import ElectricField
+from .grid import Grid
+
+# Grid spacing of ``python -m pic`` (m)
+H = 1e-4
+
+# Domain and biased wall block (m)
+GEOMETRY = {
+    "length": 0.05,
+    "height": 0.02,
+    "h_wall": 0.004,
+    "w_wall": 0.01,
+    "x_wall": 0.01,
+}
+
+# Electrode voltages (V)
+VOLTAGES = {"Vin": 1100, "Vout": -100, "Vwall": 1000}
+
+
+def make_grid(h=H, **options):
+    """
+    Return the grid of ``python -m pic`` with spacing h.
+
+    Args:
+        h (float): Grid spacing.
+        **options: ``refine``, ``refine_width`` and ``axisymmetric`` of
+            ``Grid``.
+    """
+    return Grid(h, **GEOMETRY, **VOLTAGES, **options)
+
+
+def solve(grid, **options):
+    """
+    Return the field of a grid and the time to solve and differentiate it.
+
+    Args:
+        grid (Grid): Grid to solve on.
+        **options: Keyword arguments of ``ElectricField``, such as
+            ``solver``, ``dtype`` or ``cache``.
+    """
+    t0 = time.perf_counter()
+    field = ElectricField(grid, **options)
+    return field, time.perf_counter() - t0
+
+
+def scaling_exponent(sizes, times):
+    """Return the slope of log(time) against log(size)."""
+    if len(sizes) < 2:
+        return float("nan")
+    return float(np.polyfit(np.log(sizes), np.log(times), 1)[0])
+
+
+def metadata():
+    """Return the commit, versions and machine the diagnostics ran on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "numba": kernels.available(),
+        "machine": platform.platform(),
+        "processor": platform.processor(),
+    }
@@ -1,62 +1,396 @@
 """Electric field solvers for the PIC method."""
 
+import logging
+
 import numpy as np
-from scipy.sparse.linalg import spsolve
-from scipy.interpolate import interp2d
+from scipy.sparse.linalg import splu
 import matplotlib.pyplot as plt
-from .grid import make_array
-import time
+from .cache import FieldCache
+from .grid import make_array, make_vector
+from .solver import MultigridSolver
+from .timing import TIMERS, timed
+
+logger = logging.getLogger(__name__)
+
+# Vacuum permittivity (F/m)
+EPS0 = 8.8541878128e-12
+
+SOLVERS = ("spsolve", "multigrid", "mgcg")
+ELECTRODES = ("Vin", "Vout", "Vwall")
+
+
+def sinusoid(offset, amplitude, frequency, phase=0.0):
+    """Return the electrode waveform V(t) = offset + amplitude * sin(2 pi f t + phase)."""
+    return lambda t: offset + amplitude * np.sin(2 * np.pi * frequency * t + phase)
 
 
 class ElectricField:
     """Class representing the electric field in a PIC simulation."""
 
-    def __init__(self, grid):
+    def __init__(
+        self,
+        grid,
+        solver="spsolve",
+        tol=1e-10,
+        waveforms=None,
+        space_charge=False,
+        cache=None,
+        dtype=np.float64,
+    ):
         """Initialize the electric field object.
 
+        The potential is linear in the electrode voltages, so it is solved
+        once for unit voltage on each electrode and every voltage set is a
+        weighted sum of these basis fields.
+
         Args
         ----
         grid (Grid) : a Grid object containing the mesh grid and potential information
                     of the environment (the inlet, outlet, and the walls).
+        solver (str) : "spsolve" for the direct sparse LU solve of ``grid.get_A()``,
+                    "multigrid" for matrix-free multigrid V-cycles or "mgcg" for
+                    multigrid preconditioned conjugate gradients.
+        tol (float) : relative residual tolerance of the multigrid solvers.
+        waveforms (dict) : optional map from "Vin", "Vout" or "Vwall" to a
+                    function of time giving that electrode's voltage, applied
+                    by ``update``.
+        space_charge (bool) : keep the factorization (or multigrid hierarchy)
+                    after the initial solve so that ``update_space_charge``
+                    can re-solve Poisson for the particle charge every step.
+        cache (FieldCache or str) : cache (or its directory) of the basis
+                    fields. The fields of a geometry and solver found there
+                    are memory-mapped instead of solved, and new ones stored.
+        dtype (numpy.dtype) : precision of the interleaved fields read by the
+                    gather and the push. The potential is always solved in
+                    float64; float32 halves the memory the push reads.
 
         """
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver!r}, expected one of {SOLVERS}.")
+        self.waveforms = dict(waveforms or {})
+        for name in self.waveforms:
+            if name not in ELECTRODES:
+                raise ValueError(f"Unknown electrode {name!r}, expected one of {ELECTRODES}.")
         self.grid = grid
+        self.solver = solver
+        self.tol = tol
+        self.dtype = np.dtype(dtype)
+        self.iterations = 0
+        self._linear_solver = None
+        self._space_charge = None
+        _, _, _, bottom, _, interior = grid.get_node_types()
+        # on an axisymmetric grid the axis rows carry Poisson's equation too
+        self._interior = interior | bottom if grid.axisymmetric else interior
+
+        self.cache = FieldCache(cache) if isinstance(cache, str) else cache
+        cached = None
+        if self.cache is not None:
+            key = self.cache_key()
+            with TIMERS.phase("load field"):
+                cached = self.cache.load(key)
+        if cached is not None:
+            self.V_basis = cached["V_basis"]
+            self.Ex_basis = cached["Ex_basis"]
+            self.Ey_basis = cached["Ey_basis"]
+            logger.debug("Loaded V and E from the cache")
+        else:
+            with TIMERS.phase("solve V"):
+                self.V_basis = self.solve_basis()
+            with TIMERS.phase("find E"):
+                E_basis = [self.solve_E(V) for V in self.V_basis]
+                self.Ex_basis = np.array([Ex for Ex, _ in E_basis])
+                self.Ey_basis = np.array([Ey for _, Ey in E_basis])
+            if self.cache is not None:
+                self.cache.store(
+                    key,
+                    {
+                        "V_basis": self.V_basis,
+                        "Ex_basis": self.Ex_basis,
+                        "Ey_basis": self.Ey_basis,
+                    },
+                )
+        with TIMERS.phase("set voltages"):
+            self.set_voltages(grid.Vin, grid.Vout, grid.Vwall)
+        if not space_charge:
+            self._linear_solver = None
+
+    def memory_report(self):
+        """
+        Return the bytes held by the field and its grid, per component.
+
+        An array referenced twice, like the electrode fields that are also
+        the total fields without space charge, is counted once.
+
+        Returns:
+            dict: The entries of ``Grid.memory_report`` and the bytes of the
+                "basis" fields (memory-mapped when loaded from the cache),
+                the electrode and total "fields", the "space charge" fields,
+                the "interleaved" fields read by the gather, the node "masks"
+                and the kept LU factors or multigrid hierarchy ("solver"),
+                the LU factors counted as float64 values and int32 indices.
+        """
+        seen = set()
+
+        def nbytes(*arrays):
+            total = 0
+            for a in arrays:
+                if a is not None and id(a) not in seen:
+                    seen.add(id(a))
+                    total += a.nbytes
+            return total
 
-        t0 = time.time()
-        self.V = self.solve_V()
-        print(f"Time to solve V:  {(time.time() - t0):.5f} seconds")
-        t0 = time.time()
-        self.Ex, self.Ey = self.solve_E()
-        print(f"Time to find E:  {(time.time() - t0):.5f} seconds")
-        t0 = time.time()
-        self.fEx = interp2d(self.grid.Xs[0], self.grid.Ys[:, 0], self.Ex, kind="linear")
-        self.fEy = interp2d(self.grid.Xs[0], self.grid.Ys[:, 0], self.Ey, kind="linear")
-        self.fV = interp2d(self.grid.Xs[0], self.grid.Ys[:, 0], self.V, kind="linear")
-        print(f"Time to interpolate E:  {(time.time() - t0):.5f} seconds")
-
-    def solve_V(self):
-        """Solve for the electric potential."""
-        A = self.grid.get_A()
-        b = self.grid.get_b()
-        V = spsolve(A, b)
+        report = self.grid.memory_report()
+        report["basis"] = nbytes(self.V_basis, self.Ex_basis, self.Ey_basis)
+        report["fields"] = nbytes(*self._laplace, self.V, self.Ex, self.Ey)
+        report["space charge"] = nbytes(*(self._space_charge or ()))
+        report["interleaved"] = nbytes(self._F)
+        report["masks"] = nbytes(self._interior)
+        solver = self._linear_solver
+        if solver is None:
+            report["solver"] = 0
+        elif self.solver == "spsolve":
+            report["solver"] = 12 * solver.nnz + solver.perm_r.nbytes + solver.perm_c.nbytes
+        else:
+            report["solver"] = solver.nbytes
+        return report
+
+    def cache_key(self):
+        """
+        Return the cache key of the basis fields.
+
+        The basis fields depend on the geometry and the solver but not on the
+        electrode voltages, so one entry serves every voltage set.
+        """
+        grid = self.grid
+        params = dict(
+            kind="ElectricField.basis",
+            h=grid.h,
+            length=grid.length,
+            height=grid.height,
+            h_wall=grid.h_wall,
+            w_wall=grid.w_wall,
+            x_wall=grid.x_wall,
+            Nx=grid.Nx,
+            Ny=grid.Ny,
+            solver=self.solver,
+            tol=None if self.solver == "spsolve" else self.tol,
+        )
+        if not grid.uniform:
+            params.update(refine=grid.refine, refine_width=grid.refine_width)
+        if grid.axisymmetric:
+            params.update(axisymmetric=True)
+        return FieldCache.key(**params)
+
+    @timed("solve")
+    def _solve(self, bs, x0=None):
+        """
+        Solve the grid system for each right hand side in bs.
+
+        The LU factorization of ``grid.get_A()`` or the multigrid hierarchy
+        is built on the first call and reused afterwards. ``x0`` is an
+        initial guess for the multigrid solvers.
+        """
+        if self._linear_solver is None:
+            if self.solver == "spsolve":
+                self._linear_solver = splu(self.grid.get_A().tocsc())
+                # the factors are all the solves need
+                self.grid.free_operator()
+            else:
+                method = "vcycle" if self.solver == "multigrid" else "cg"
+                self._linear_solver = MultigridSolver(self.grid, tol=self.tol, method=method)
+
+        TIMERS.count("linear solves", len(bs))
+        if self.solver == "spsolve":
+            return [self._linear_solver.solve(b) for b in bs]
+
+        Vs = []
+        self.iterations = 0
+        for b in bs:
+            Vs.append(self._linear_solver.solve(b, x0))
+            self.iterations = max(self.iterations, self._linear_solver.iterations)
+        return Vs
+
+    def solve_V(self, b=None):
+        """Solve for the electric potential, by default with ``grid.get_b()``."""
+        if b is None:
+            b = self.grid.get_b()
+        V = self._solve([b])[0]
         return make_array(V, self.grid.Nx, self.grid.Ny)
 
-    def solve_E(self):
-        """Solve for the electric field."""
-        Ey, Ex = np.gradient(self.V, self.grid.h)
+    def solve_basis(self):
+        """Solve for the potential of unit voltage on each electrode."""
+        Vs = self._solve(self.grid.get_b_basis())
+        if self.solver != "spsolve":
+            logger.debug("Multigrid iterations: %d", self.iterations)
+        return np.array([make_array(V, self.grid.Nx, self.grid.Ny) for V in Vs])
+
+    @timed("gradient")
+    def solve_E(self, V=None):
+        """Solve for the electric field, by default of the current potential."""
+        if V is None:
+            V = self.V
+        if self.grid.uniform:
+            Ey, Ex = np.gradient(V, self.grid.h)
+        else:
+            Ey, Ex = np.gradient(V, self.grid.ys, self.grid.xs)
         Ey[0, :] = 0
         Ey[-1, :] = 0
         Ex = -Ex
         Ey = -Ey
         return Ex, Ey
 
+    def set_voltages(self, Vin, Vout, Vwall):
+        """Set the electrode voltages by superposing the basis fields."""
+        self.voltages = np.array([Vin, Vout, Vwall], dtype=float)
+        self._laplace = [
+            np.tensordot(self.voltages, basis, axes=1)
+            for basis in (self.V_basis, self.Ex_basis, self.Ey_basis)
+        ]
+        self._update_fields()
+
+    def _update_fields(self):
+        """Add the space charge fields to the electrode fields."""
+        if self._space_charge is None:
+            self.V, self.Ex, self.Ey = self._laplace
+        else:
+            self.V, self.Ex, self.Ey = (
+                a + b for a, b in zip(self._laplace, self._space_charge)
+            )
+        # Interleave the fields so one gather fetches Ex, Ey and V together.
+        self._F = np.stack((self.Ex, self.Ey, self.V), axis=-1).reshape(-1, 3)
+        self._F = self._F.astype(self.dtype, copy=False)
+
+    def update(self, t):
+        """Apply the electrode waveforms at time t, if any were given."""
+        if not self.waveforms:
+            return
+        voltages = [
+            self.waveforms[name](t) if name in self.waveforms else v
+            for name, v in zip(ELECTRODES, self.voltages)
+        ]
+        self.set_voltages(*voltages)
+
+    @timed("gather")
+    def gather(self, positions, potential=False):
+        """
+        Interpolate the fields bilinearly at many positions at once.
+
+        Positions outside the grid take the value at the nearest grid edge.
+
+        Args:
+            positions (numpy.ndarray): (N, 2) array of x, y positions.
+            potential (bool): also return the potential.
+
+        Returns:
+            numpy.ndarray: (N, 2) electric field, followed by the (N,)
+                potential if ``potential`` is set.
+        """
+        nx = self.V.shape[1]
+        k, fx, fy = self._cell_weights(positions)
+        fx = fx[:, None]
+        fy = fy[:, None]
+        F = self._F
+        low = F[k] + fx * (F[k + 1] - F[k])
+        high = F[k + nx] + fx * (F[k + nx + 1] - F[k + nx])
+        out = low + fy * (high - low)
+
+        if potential:
+            return out[:, :2], out[:, 2]
+        return out[:, :2]
+
+    def _cell_weights(self, positions):
+        """
+        Return the flat index of the lower left node of each position's cell
+        and the fractional offsets within the cell, for bilinear weighting.
+
+        On an axisymmetric grid the radial offset is linear in r**2 rather
+        than r (volume weighting), for both the gather and the deposit.
+        """
+        grid = self.grid
+        ny, nx = self.V.shape
+        positions = np.asarray(positions)
+        if grid.uniform:
+            h = grid.h
+            x = np.clip(positions[:, 0] / h, 0, nx - 1)
+            y = np.clip(positions[:, 1] / h, 0, ny - 1)
+            i = np.minimum(x.astype(np.intp), nx - 2)
+            j = np.minimum(y.astype(np.intp), ny - 2)
+            fx, fy = x - i, y - j
+        else:
+            # graded grid: locate the cell through the uniform fine grid the
+            # nodes are taken from, in units of its spacing
+            h = grid.h_min
+            xi, yi = grid.x_index, grid.y_index
+            x = np.clip(positions[:, 0] / h, 0, xi[-1])
+            y = np.clip(positions[:, 1] / h, 0, yi[-1])
+            i = grid.x_cells[x.astype(np.intp)]
+            j = grid.y_cells[y.astype(np.intp)]
+            fx = (x - xi[i]) / (xi[i + 1] - xi[i])
+            fy = (y - yi[j]) / (yi[j + 1] - yi[j])
+        if grid.axisymmetric:
+            r0, r1 = grid.ys[j], grid.ys[j + 1]
+            r = r0 + fy * (r1 - r0)
+            fy = (r**2 - r0**2) / (r1**2 - r0**2)
+        return j * nx + i, fx, fy
+
+    @timed("deposit")
+    def deposit(self, positions, charge):
+        """
+        Deposit particle charge on the grid with cloud-in-cell weighting.
+
+        Args:
+            positions (numpy.ndarray): (N, 2) array of particle positions.
+            charge (float): charge carried by each (macro) particle, per unit
+                depth out of the plane (C/m), or the charge of the whole
+                ring (C) on an axisymmetric grid.
+
+        Returns:
+            numpy.ndarray: (Ny, Nx) charge density (C/m^3).
+        """
+        ny, nx = self.V.shape
+        k, fx, fy = self._cell_weights(positions)
+        idx = np.concatenate((k, k + 1, k + nx, k + nx + 1))
+        w = np.concatenate(
+            ((1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy)
+        )
+        rho = np.bincount(idx, w, minlength=nx * ny).reshape(ny, nx)
+        if self.grid.uniform and not self.grid.axisymmetric:
+            return rho * (charge / self.grid.h**2)
+        return rho * charge / self.grid.node_volumes()
+
+    def solve_space_charge(self, rho):
+        """Solve Poisson for a charge density with grounded electrodes."""
+        b = np.zeros(self.grid.Nx * self.grid.Ny)
+        b[self._interior] = -make_vector(rho.T, self.grid.Nx, self.grid.Ny)[self._interior] / EPS0
+        x0 = None
+        if self._space_charge is not None:
+            x0 = make_vector(self._space_charge[0].T, self.grid.Nx, self.grid.Ny)
+        V = self._solve([b], x0)[0]
+        return make_array(V, self.grid.Nx, self.grid.Ny)
+
+    def update_space_charge(self, positions, charge):
+        """
+        Include the field of the particles' own charge (self-consistent mode).
+
+        The charge is deposited, Poisson is re-solved with the factorization
+        kept from the initial solve and the result is added to the electrode
+        fields.
+
+        Args:
+            positions (numpy.ndarray): (N, 2) array of particle positions.
+            charge (float): charge per (macro) particle per unit depth (C/m).
+        """
+        V = self.solve_space_charge(self.deposit(positions, charge))
+        self._space_charge = (V,) + self.solve_E(V)
+        self._update_fields()
+
     def get_field_at(self, x):
         """Return the electric field at a given position."""
-        return np.array([self.fEx(x[0], x[1]), self.fEy(x[0], x[1])]).flatten()
-    
+        return self.gather(np.reshape(x, (1, 2)))[0]
+
     def get_potential_at(self, x):
         """Return the potential at a given position."""
-        return self.fV(x[0], x[1])
+        return self.gather(np.reshape(x, (1, 2)), potential=True)[1][0]
 
     def plot_E_field(self, new_fig=True):
         """Plot the electric field."""
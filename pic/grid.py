@@ -3,11 +3,27 @@
 import numpy as np
 from scipy.sparse import csr_matrix
 
+from .timing import timed
+
 
 class Grid:
     """Class representing a finite difference grid for the PIC method."""
 
-    def __init__(self, h, length, height, h_wall, w_wall, x_wall, Vin, Vout, Vwall):
+    def __init__(
+        self,
+        h,
+        length,
+        height,
+        h_wall,
+        w_wall,
+        x_wall,
+        Vin,
+        Vout,
+        Vwall,
+        refine=1,
+        refine_width=None,
+        axisymmetric=False,
+    ):
         """
         Initialize the grid object.
 
@@ -21,6 +37,18 @@ class Grid:
             Vin (float) : inlet voltage
             Vout (float) : outlet voltage
             Vwall (float) : voltage of the biased wall
+            refine (int) : refinement factor around the biased wall. With
+                refine > 1 the spacing is h / refine within ``refine_width``
+                of the wall faces (the lines x = x_wall, x = x_wall + w_wall
+                and y = h_wall) and doubles at most from one node to the next
+                away from them, up to h. The nodes are a subset of the
+                uniform grid of spacing h / refine.
+            refine_width (float) : distance from the wall faces meshed at the
+                finest spacing, by default 4 * h.
+            axisymmetric (bool) : solve in axisymmetric (z, r) coordinates,
+                with x the axial coordinate z and y the radius r. The bottom
+                edge is then the axis of symmetry and the biased wall a
+                cylinder of radius h_wall around it.
 
         """
         self.h = h
@@ -34,12 +62,47 @@ class Grid:
         self.Vout = Vout
         self.Vwall = Vwall
 
-        self.Xs, self.Ys = np.meshgrid(np.arange(0, length, h), np.arange(0, height, h))
-
-        self.Nx = int(length / h)
-        self.Ny = int(height / h)
-
-        self._A, self._b = self.get_laplacian()
+        self.axisymmetric = axisymmetric
+        self.refine = refine
+        self.refine_width = 4 * h if refine_width is None else refine_width
+        self.uniform = refine == 1
+        # smallest spacing; node coordinates are integer multiples of it
+        self.h_min = h / refine
+        if self.uniform:
+            self.x_index = np.arange(int(length / h))
+            self.y_index = np.arange(int(height / h))
+        else:
+            h_min = self.h_min
+            width = int(self.refine_width / h_min)
+            self.x_index = graded_axis(
+                int(length / h_min),
+                refine,
+                [int(x_wall / h_min), int((x_wall + w_wall) / h_min)],
+                width,
+            )
+            self.y_index = graded_axis(
+                int(height / h_min), refine, [int(h_wall / h_min)], width
+            )
+        self.x_cells = cell_lookup(self.x_index)
+        self.y_cells = cell_lookup(self.y_index)
+        self.xs = self.x_index * self.h_min
+        self.ys = self.y_index * self.h_min
+
+        self.Nx = len(self.xs)
+        self.Ny = len(self.ys)
+
+        # assembled on first use, runs with cached fields never need them
+        self._A = self._b = None
+
+    @property
+    def Xs(self):
+        """Return the (Ny, Nx) x coordinates of the nodes, a read-only view of xs."""
+        return np.broadcast_to(self.xs, (self.Ny, self.Nx))
+
+    @property
+    def Ys(self):
+        """Return the (Ny, Nx) y coordinates of the nodes, a read-only view of ys."""
+        return np.broadcast_to(self.ys[:, None], (self.Ny, self.Nx))
 
     def get_h(self):
         """Return the grid spacing."""
@@ -67,96 +130,233 @@ class Grid:
 
     def get_A(self):
         """Return the coefficient matrix A."""
+        if self._A is None:
+            self._A, self._b = self.get_laplacian()
         return self._A
 
     def get_b(self):
         """Return the RHS vector b."""
+        if self._b is None:
+            self._A, self._b = self.get_laplacian()
         return self._b
 
+    def free_operator(self):
+        """Drop the assembled matrix A, rebuilt by ``get_A`` if needed again."""
+        self._A = None
+
+    def memory_report(self):
+        """
+        Return the bytes held by the grid.
+
+        Returns:
+            dict: Bytes of the 1D axes and lookup tables ("axes"), of the
+                sparse matrix A ("operator") and of the RHS vector b ("rhs"),
+                zero for the parts not assembled.
+        """
+        axes = (self.xs, self.ys, self.x_index, self.y_index, self.x_cells, self.y_cells)
+        A = self._A
+        return {
+            "axes": sum(a.nbytes for a in axes),
+            "operator": 0 if A is None else A.data.nbytes + A.indices.nbytes + A.indptr.nbytes,
+            "rhs": 0 if self._b is None else self._b.nbytes,
+        }
+
+    def get_node_types(self):
+        """
+        Classify every grid node by the equation it carries.
+
+        Nodes are numbered ``id = i * Ny + j`` as in the Laplacian. Where
+        conditions overlap, the inlet wins over the outlet, the outlet over
+        the wall and any Dirichlet node over the Neumann rows.
+
+        Returns:
+            tuple: Boolean arrays of length ``Nx * Ny`` marking the inlet,
+                outlet, wall, bottom (Neumann, or the axis when axisymmetric),
+                top (Neumann) and interior nodes.
+        """
+        h = self.h_min
+        i, j = np.divmod(np.arange(self.Nx * self.Ny, dtype=np.int32), self.Ny)
+        # position of the nodes in units of the smallest spacing
+        x = self.x_index[i]
+        y = self.y_index[j]
+
+        inlet = i == 0
+        outlet = (i == self.Nx - 1) & ~inlet
+        wall = (
+            (x >= int(self.x_wall / h))
+            & (x <= int((self.x_wall + self.w_wall) / h))
+            & (y <= int(self.h_wall / h))
+            & ~inlet
+            & ~outlet
+        )
+        dirichlet = inlet | outlet | wall
+        bottom = (j == 0) & ~dirichlet
+        top = (j == self.Ny - 1) & ~dirichlet & ~bottom
+        interior = ~(dirichlet | bottom | top)
+
+        return inlet, outlet, wall, bottom, top, interior
+
+    def node_areas(self):
+        """Return the (Ny, Nx) area of the cell around each node, h**2 when uniform."""
+        if self.uniform:
+            return np.full((self.Ny, self.Nx), self.h**2)
+        return np.outer(np.gradient(self.ys), np.gradient(self.xs))
+
+    def node_volumes(self):
+        """
+        Return the (Ny, Nx) volume each node collects charge from.
+
+        In the plane this is ``node_areas`` times a unit depth. On an
+        axisymmetric grid node j gets half of the rings between r_j-1 and
+        r_j+1, pi (r_j+1**2 - r_j-1**2) / 2, matching the deposit weights
+        that are linear in r**2, so a uniform density is deposited exactly.
+        """
+        if not self.axisymmetric:
+            return self.node_areas()
+        r = self.ys
+        lo = r[np.maximum(np.arange(self.Ny) - 1, 0)]
+        hi = r[np.minimum(np.arange(self.Ny) + 1, self.Ny - 1)]
+        return np.outer(np.pi * (hi**2 - lo**2) / 2, np.gradient(self.xs))
+
+    def get_b_basis(self):
+        """Return the RHS vectors for unit voltage on the inlet, outlet and wall."""
+        inlet, outlet, wall, _, _, _ = self.get_node_types()
+        return [inlet.astype(float), outlet.astype(float), wall.astype(float)]
+
+    @timed("assembly")
     def get_laplacian(self):
-        """Return the 2D Laplacian operator using sparse matrix."""
-        data = []
-        b = np.zeros(self.Nx * self.Ny)
+        """
+        Return the 2D Laplacian operator using sparse matrix.
+
+        On an axisymmetric grid it is the Laplacian in (z, r) coordinates,
+        d2V/dz2 + (1/r) d/dr (r dV/dr), and the bottom row is the axis.
+        """
         h = self.h
+        Ny = self.Ny
+        ids = np.arange(self.Nx * self.Ny, dtype=np.int32)
+        inlet, outlet, wall, bottom, top, interior = self.get_node_types()
+
+        b = np.zeros(self.Nx * self.Ny)
+        b[inlet] = self.Vin
+        b[outlet] = self.Vout
+        b[wall] = self.Vwall
+
+        dirichlet = ids[inlet | outlet | wall]
+        bottom = ids[bottom]
+        top = ids[top]
+        interior = ids[interior]
+
+        # Dirichlet rows are phi_i,j = V, Neumann rows set phi_i,j equal to
+        # its neighbour inside the domain (zero normal derivative) and the
+        # rest of the domain uses the 5-point stencil, with the three point
+        # second differences of unequal spacing on a graded grid.
+        n_int = len(interior)
+        if self.uniform and not self.axisymmetric:
+            west = east = south = north = np.full(n_int, 1 / h**2)
+            centre = np.full(n_int, -4 / h**2)
+        else:
+            i, j = np.divmod(interior, Ny)
+            dx = np.diff(self.xs)
+            dy = np.diff(self.ys)
+            hw, he = dx[i - 1], dx[i]
+            hs, hn = dy[j - 1], dy[j]
+            west = 2 / (hw * (hw + he))
+            east = 2 / (he * (hw + he))
+            south = 2 / (hs * (hs + hn))
+            north = 2 / (hn * (hs + hn))
+            if self.axisymmetric:
+                # (1/r) dV/dr by the central difference of unequal spacing,
+                # which like the second difference has zero row sum
+                r = self.ys[j]
+                south = south - hn / (r * hs * (hs + hn))
+                north = north + hs / (r * hn * (hs + hn))
+            centre = -(west + east + south + north)
+        blocks = [(dirichlet, dirichlet, np.ones(len(dirichlet)))]
+        if self.axisymmetric:
+            # On the axis dV/dr = 0 and (1/r) d/dr (r dV/dr) -> 4 (V_1 - V_0) / dr**2,
+            # the flux through the disk of radius dr / 2 around the node.
+            i = bottom // Ny
+            dx = np.diff(self.xs)
+            hw, he = dx[i - 1], dx[i]
+            radial = 4 / (self.ys[1] - self.ys[0]) ** 2
+            axis_west = 2 / (hw * (hw + he))
+            axis_east = 2 / (he * (hw + he))
+            blocks += [
+                (bottom, bottom, -(axis_west + axis_east + radial)),
+                (bottom, bottom + Ny, axis_east),
+                (bottom, bottom - Ny, axis_west),
+                (bottom, bottom + 1, np.full(len(bottom), radial)),
+            ]
+        else:
+            blocks += [
+                (bottom, bottom, np.ones(len(bottom))),
+                (bottom, bottom + 1, -np.ones(len(bottom))),
+            ]
+        blocks += [
+            (top, top, np.ones(len(top))),
+            (top, top - 1, -np.ones(len(top))),
+            (interior, interior, centre),
+            (interior, interior + Ny, east),
+            (interior, interior - Ny, west),
+            (interior, interior + 1, north),
+            (interior, interior - 1, south),
+        ]
+        rows, cols, vals = (np.concatenate(block) for block in zip(*blocks))
+        del blocks
 
-        for i in range(self.Nx):
-            for j in range(self.Ny):
-                id = i * self.Ny + j
-
-                # Inlet Boundary Condition
-                if i == 0:
-                    data.append(np.array([id, id, 1]))
-                    b[id] = self.Vin
-
-                # Outlet Boundary Condition
-                elif i == self.Nx - 1:
-                    data.append(np.array([id, id, 1]))
-                    b[id] = self.Vout
-
-                # Wall Boundary Condition
-                elif (
-                    i >= int(self.x_wall / h)
-                    and i <= int((self.x_wall + self.w_wall) / h)
-                ) and (j <= int(self.h_wall / h)):
-                    data.append(np.array([id, id, 1]))
-                    b[id] = self.Vwall
-
-                # Neumann Boundary Condition at bottom
-                elif j == 0:
-                    # make it so that we have an eqn that says
-                    # phi_i,j = phi_i,j+1 i.e. that the deriv is zero
-                    # i,j term of potential
-                    data.append(np.array([id, id, 1]))
-                    # i, j+1 term
-                    data.append(np.array([id, id + 1, -1]))
-
-                # Neumann Boundary Condition at top
-                elif j == self.Ny - 1:
-                    # make it so that we have an eqn that says
-                    # phi_i,j = phi_i,j-1 i.e. that the deriv is zero
-                    data.append(np.array([id, id, 1]))
-                    data.append(np.array([id, id - 1, -1]))
-
-                # Rest of the domain with standar Laplacian
-                else:
-                    # the i,j term
-                    data.append(np.array([id, id, -4 / h**2]))
-                    # the (i+1),j term
-                    data.append(np.array([id, id + self.Ny, 1 / h**2]))
-                    # the (i-1), j term
-                    data.append(np.array([id, id - self.Ny, 1 / h**2]))
-                    # the i, j+1 term
-                    data.append(np.array([id, id + 1, 1 / h**2]))
-                    # the i, j-1 term
-                    data.append(np.array([id, id - 1, 1 / h**2]))
-
-        data = np.array(data)
-        self.data = data
         A = csr_matrix(
-            (data[:, 2], (data[:, 0], data[:, 1])),
+            (vals, (rows, cols)),
             shape=(self.Nx * self.Ny, self.Nx * self.Ny),
         )
         return A, b
 
 
+def graded_axis(n, refine, centers, width):
+    """
+    Return the nodes of a graded axis as indices into a uniform fine axis.
+
+    Every fine node within ``width`` fine cells of a center is kept. Further
+    out the step is the largest power of two up to half the distance beyond
+    that band, and ``refine`` once that distance reaches 2 * refine, so the
+    spacing at most doubles from one node to the next.
+
+    Args:
+        n (int): Number of nodes of the fine axis.
+        refine (int): Largest step, in fine cells.
+        centers (list): Fine indices around which the axis is refined.
+        width (int): Half width, in fine cells, of the finest band.
+
+    Returns:
+        numpy.ndarray: Increasing fine indices, from 0 to n - 1.
+    """
+    centers = np.asarray(centers)
+    nodes = [0]
+    while nodes[-1] < n - 1:
+        p = nodes[-1]
+        excess = np.abs(centers - p).min() - width
+        step = 1
+        if excess >= 2 * refine:
+            step = refine
+        while 2 * step <= min(refine, excess / 2):
+            step *= 2
+        nodes.append(p + min(step, refine, n - 1 - p))
+    return np.array(nodes)
+
+
+def cell_lookup(index):
+    """Return the node interval of an axis containing each fine cell."""
+    cells = np.searchsorted(index, np.arange(index[-1] + 1), side="right") - 1
+    return np.minimum(cells, len(index) - 2)
+
+
 def make_vector(x, Nx, Ny):
     """Return a vector from a 2D array."""
-    vec = np.zeros(Nx * Ny)
-    for i in range(Nx):
-        for j in range(Ny):
-            vec[i * Ny + j] = x[i, j]
-
-    return vec
+    return np.array(x, dtype=float)[:Nx, :Ny].reshape(Nx * Ny)
 
 
 def make_array(x, Nx, Ny):
     """Return a 2D array from a vector."""
-    arr = np.zeros([Ny, Nx])
-    for i in range(Ny):
-        for j in range(Nx):
-            arr[i, j] = x[j * Ny + i]
-
-    return arr
+    return np.asarray(x, dtype=float).reshape(Nx, Ny).T.copy()
 
 
 def get_id(i, j, Nx, Ny):
@@ -1,59 +1,92 @@
-"""Implementations of particle pushers for PIC simulations."""
+"""Implementations of particle pushers for PIC simulations.
+
+All pushers share the batched signature ``pusher(x, v, fields, qm, dt)``:
+``x`` and ``v`` are (N, d) arrays of positions and velocities, ``fields`` is
+a callable returning the electric field ``E`` (N, d) and the magnetic field
+``B`` ((N, 3), (3,) or None) at an (N, d) array of positions, and ``qm`` is
+the charge to mass ratio. In 2D only the z component of ``B`` is used.
+``boris_rz`` pushes axisymmetric (z, r) runs, with (N, 3) velocities.
+"""
 
 import numpy as np
 
 
-def euler(x, v, a, dt):
+def _as_3d(v, B):
+    """Return velocities and magnetic field as 3-vectors."""
+    B = np.asarray(B, dtype=float)
+    if v.shape[-1] == 3:
+        return v, B
+    v3 = np.zeros(v.shape[:-1] + (3,), dtype=v.dtype)
+    v3[..., :2] = v
+    B3 = np.zeros(B.shape, dtype=v.dtype)
+    B3[..., 2] = B[..., 2]
+    return v3, B3
+
+
+def _acceleration(fields, qm, x, v):
+    """Return the Lorentz acceleration qm * (E + v x B)."""
+    E, B = fields(x)
+    if B is None:
+        return qm * E
+    v3, B3 = _as_3d(v, B)
+    return qm * (E + np.cross(v3, B3)[..., : v.shape[-1]])
+
+
+def _rotate(v, t):
+    """Return the solution u of u = v + u x t for rows of v and t."""
+    t2 = np.sum(t * t, axis=-1, keepdims=True)
+    vt = np.sum(v * t, axis=-1, keepdims=True)
+    return (v + np.cross(v, t) + vt * t) / (1 + t2)
+
+
+def euler(x, v, fields, qm, dt):
     """
     Implements the Euler forward method for particle pushing.
 
     Args:
-        x (numpy.ndarray): Initial position of the particle (2D vector).
-        v (numpy.ndarray): Initial velocity of the particle (2D vector).
-        a (callable): Acceleration function that takes position and velocity as arguments.
+        x (numpy.ndarray): Initial positions of the particles, (N, d) array.
+        v (numpy.ndarray): Initial velocities of the particles, (N, d) array.
+        fields (callable): Returns the fields E and B at an array of positions.
+        qm (float): Charge to mass ratio of the particles.
         dt (float): Time step.
 
     Returns:
-        tuple: Updated position and velocity of the particle after the push.
+        tuple: Updated positions and velocities of the particles after the push.
     """
     # Update velocity using acceleration
-    v_new = v + a(x) * dt
+    v_new = v + _acceleration(fields, qm, x, v) * dt
     # Update position using updated velocity
     x_new = x + v_new * dt
 
     return x_new, v_new
 
 
-def rk4(x, v, a, dt):
+def rk4(x, v, fields, qm, dt):
     """
     Implements the fourth-order Runge-Kutta (RK4) method for particle pushing.
 
     Args:
-        x (numpy.ndarray): Initial position of the particle (2D vector).
-        v (numpy.ndarray): Initial velocity of the particle (2D vector).
-        a (callable): Acceleration function that takes position and velocity as arguments.
+        x (numpy.ndarray): Initial positions of the particles, (N, d) array.
+        v (numpy.ndarray): Initial velocities of the particles, (N, d) array.
+        fields (callable): Returns the fields E and B at an array of positions.
+        qm (float): Charge to mass ratio of the particles.
         dt (float): Time step.
 
     Returns:
-        tuple: Updated position and velocity of the particle after the push.
+        tuple: Updated positions and velocities of the particles after the push.
     """
-
-    # print(f"{x=}")
-    # print(f"{v=}")
-
-    # print("Acceleration = ", a(x))
     # Define the RK4 coefficients
-    k1_v = a(x)
+    k1_v = _acceleration(fields, qm, x, v)
     k1_x = v
 
-    k2_v = a(x + 0.5 * dt * k1_x)
     k2_x = v + 0.5 * dt * k1_v
+    k2_v = _acceleration(fields, qm, x + 0.5 * dt * k1_x, k2_x)
 
-    k3_v = a(x + 0.5 * dt * k2_x)
     k3_x = v + 0.5 * dt * k2_v
+    k3_v = _acceleration(fields, qm, x + 0.5 * dt * k2_x, k3_x)
 
-    k4_v = a(x + dt * k3_x)
     k4_x = v + dt * k3_v
+    k4_v = _acceleration(fields, qm, x + dt * k3_x, k4_x)
 
     # Update position and velocity using RK4
     x_new = x + (dt / 6) * (k1_x + 2 * k2_x + 2 * k3_x + k4_x)
@@ -62,93 +95,214 @@ def rk4(x, v, a, dt):
     return x_new, v_new
 
 
-def leapfrog(x, v, a, dt, use_verlet=False):
+def leapfrog(x, v, fields, qm, dt, use_verlet=False):
     """
     Implements the leapfrog algorithm for particle pushing.
 
+    The default drift-kick-drift form needs a single field evaluation per
+    step, at the half-step position. For magnetized runs prefer ``boris``.
+
     Args:
-        x (numpy.ndarray): Initial position of the particle (2D vector).
-        v (numpy.ndarray): Initial velocity of the particle (2D vector).
-        a (numpy.ndarray): Acceleration of the particle (2D vector).
+        x (numpy.ndarray): Initial positions of the particles, (N, d) array.
+        v (numpy.ndarray): Initial velocities of the particles, (N, d) array.
+        fields (callable): Returns the fields E and B at an array of positions.
+        qm (float): Charge to mass ratio of the particles.
         dt (float): Time step.
         use_verlet (bool): Flag to use velocity Verlet algorithm (default: False).
 
     Returns:
-        tuple: Updated position and velocity of the particle after the push.
+        tuple: Updated positions and velocities of the particles after the push.
     """
     if use_verlet:
         # Velocity Verlet algorithm
-        x_new = x + v * dt + 0.5 * a(x) * dt**2
-        v_new = v + 0.5 * (a + a) * dt
+        v_half = v + 0.5 * _acceleration(fields, qm, x, v) * dt
+        x_new = x + v_half * dt
+        v_new = v_half + 0.5 * _acceleration(fields, qm, x_new, v_half) * dt
     else:
         # Leapfrog algorithm
-        v_half = v + 0.5 * a(x) * dt
-        x_new = x + v_half * dt
-        v_new = v_half + 0.5 * a(x) * dt
+        x_half = x + 0.5 * v * dt
+        v_new = v + _acceleration(fields, qm, x_half, v) * dt
+        x_new = x_half + 0.5 * v_new * dt
+
+    return x_new, v_new
+
+
+def tajima_implicit(x, v, fields, qm, dt):
+    """
+    Implements Tajima's implicit scheme for particle pushing.
+
+    Solves v_new - v = qm * dt * (E + (v_new + v) / 2 x B) in closed form
+    instead of inverting the 3x3 rotation matrix for every particle. The
+    original version subtracted qm * E * dt / 2 before the rotation, so the
+    step gained only half the electric kick; the full kick is applied now.
+
+    Args:
+        x (numpy.ndarray): Initial positions of the particles, (N, d) array.
+        v (numpy.ndarray): Initial velocities of the particles, (N, d) array.
+        fields (callable): Returns the fields E and B at an array of positions.
+        qm (float): Charge to mass ratio of the particles.
+        dt (float): Time step.
+
+    Returns:
+        tuple: Updated positions and velocities of the particles after the push.
+    """
+    E, B = fields(x)
+    if B is None:
+        v_new = v + qm * E * dt
+    else:
+        d = v.shape[-1]
+        v3, B3 = _as_3d(v, B)
+        E3, _ = _as_3d(E, B)
+        t = 0.5 * qm * dt * B3  # = omega*dt/2 along B
+        v_new = _rotate(v3 + np.cross(v3, t) + qm * dt * E3, t)[..., :d]
+    x_new = x + v_new * dt
+
+    return x_new, v_new
+
+
+def tajima_explicit(x, v, fields, qm, dt):
+    """
+    Implements Tajima's explicit scheme for particle pushing.
+
+    The velocity is rotated with the first order explicit rotation
+    (I + omega * dt * R), R v = v x B / |B|, which does not preserve its
+    magnitude exactly. The original version used omega * dt / 2, turning the
+    velocity through half the gyration angle of the step, and subtracted the
+    first half of the electric kick instead of adding it. Both are fixed
+    here: v_new = v + qm * dt * (E + v_minus x B) with
+    v_minus = v + qm * E * dt / 2.
+
+    Args:
+        x (numpy.ndarray): Initial positions of the particles, (N, d) array.
+        v (numpy.ndarray): Initial velocities of the particles, (N, d) array.
+        fields (callable): Returns the fields E and B at an array of positions.
+        qm (float): Charge to mass ratio of the particles.
+        dt (float): Time step.
+
+    Returns:
+        tuple: Updated positions and velocities of the particles after the push.
+    """
+    E, B = fields(x)
+    v_minus = v + 0.5 * qm * E * dt
+    if B is not None:
+        d = v.shape[-1]
+        v3, B3 = _as_3d(v_minus, B)
+        v_minus = v_minus + np.cross(v3, qm * dt * B3)[..., :d]
+    v_new = v_minus + 0.5 * qm * E * dt
+    x_new = x + v_new * dt
 
     return x_new, v_new
 
-def tajima_implicit(x, v, E, B, q, m, dt):
-    
-    v_minus_half = v - 0.5*q/m*E*dt;
-    
-    B_mag = np.linalg.norm(B)
-    
-    eps = q*B_mag/m*dt/2 # = omega*dt/2
-    R = 1/B_mag * np.array([[0, B[2], -B[1]], [-B[2], 0, B[0]], [B[1], -B[0], 0]])
-    
-    M_minus = np.eye(3) - R * eps
-    M_plus = np.eye(3) + R * eps
-    M_inv = np.linalg.inv(M_minus) # matrix inversion
-    
-    v = M_inv @ (M_plus @ v_minus_half) + M_inv @ E * q/m * dt
-    x = x + v*dt
-    
-    return x, v
-
-def tajima_explicit(x, v, E, B, q, m, dt):
-    
-    v_minus_half = v - 0.5*q/m*E*dt;
-    
-    B_mag = np.linalg.norm(B)
-    
-    eps = q*B_mag/m*dt/2 # = omega*dt/2
-    R = 1/B_mag * np.array([[0, B[2], -B[1]], [-B[2], 0, B[0]], [B[1], -B[0], 0]])
-    
-    v = q/m*E*dt/2 + (np.eye(3) + R * eps) @ (v_minus_half + q/m*dt/2*E)
-    x = x + v*dt
-    
-    return x,
-
-def boris(x, v, E, B, q, m, dt):
+
+def boris(x, v, fields, qm, dt):
     """
     Implements the Boris algorithm for particle pushing.
 
+    The velocity gets half the electric kick, turns about B with the Lorentz
+    sense v x B and gets the other half. The original version subtracted the
+    first half kick, which cancelled the electric field over a step.
+
     Args:
-        x (numpy.ndarray): Initial position of the particle (2D vector).
-        v (numpy.ndarray): Initial velocity of the particle (2D vector).
-        E (numpy.ndarray): Electric field (2D vector).
-        B (numpy.ndarray): Magnetic field (2D vector).
-        q (float): Charge of the particle.
-        m (float): Mass of the particle.
+        x (numpy.ndarray): Initial positions of the particles, (N, d) array.
+        v (numpy.ndarray): Initial velocities of the particles, (N, d) array.
+        fields (callable): Returns the fields E and B at an array of positions.
+        qm (float): Charge to mass ratio of the particles.
         dt (float): Time step.
 
     Returns:
-        tuple: Updated position and velocity of the particle after the push.
+        tuple: Updated positions and velocities of the particles after the push.
     """
+    E, B = fields(x)
+
     # Step 1: Half-update of velocity
-    v_minus = v - (q * E / m) * (dt / 2)
+    v_minus = v + qm * E * (dt / 2)
 
     # Step 2: Rotation of velocity
-    t = (q * B / m) * (dt / 2)
-    s = 2 * t / (1 + np.dot(t, t))
-    v_prime = v_minus + np.cross(v_minus, t)
-    v_plus = v_minus + np.cross(v_prime, s)
+    if B is None:
+        v_plus = v_minus
+    else:
+        d = v.shape[-1]
+        v3, B3 = _as_3d(v_minus, B)
+        t = qm * B3 * (dt / 2)
+        s = 2 * t / (1 + np.sum(t * t, axis=-1, keepdims=True))
+        v_prime = v3 + np.cross(v3, t)
+        v_plus = (v3 + np.cross(v_prime, s))[..., :d]
 
     # Step 3: Half-update of velocity
-    v_new = v_plus + (q * E / m) * (dt / 2)
+    v_new = v_plus + qm * E * (dt / 2)
 
     # Step 4: Update of position
     x_new = x + v_new * dt
 
     return x_new, v_new
+
+
+def boris_rz(x, v, fields, qm, dt):
+    """
+    Implements the Boris algorithm in axisymmetric (z, r) coordinates.
+
+    Positions are (z, r) and velocities (v_z, v_r, v_theta). The velocity is
+    advanced by the Boris scheme in the local (z, r, theta) frame, which is
+    right handed, so a uniform magnetic field is given as (B_z, B_r, B_theta)
+    and an axial field is (B_z, 0, 0). The particle then moves in a straight
+    line in the plane through it perpendicular to the axis, and the velocity
+    is rotated into the frame of its new azimuth. This rotation carries the
+    centrifugal and Coriolis terms exactly (r * v_theta is conserved without
+    fields) and stays regular on the axis.
+
+    Args:
+        x (numpy.ndarray): Initial positions of the particles, (N, 2) array.
+        v (numpy.ndarray): Initial velocities of the particles, (N, 3) array.
+        fields (callable): Returns the fields E (N, 2) and B at an array of
+            positions.
+        qm (float): Charge to mass ratio of the particles.
+        dt (float): Time step.
+
+    Returns:
+        tuple: Updated positions and velocities of the particles after the push.
+    """
+    E, B = fields(x)
+    E3 = np.zeros(v.shape, dtype=v.dtype)
+    E3[:, :2] = E
+
+    v_minus = v + qm * E3 * (dt / 2)
+    if B is None:
+        v_plus = v_minus
+    else:
+        t = qm * np.asarray(B, dtype=v.dtype) * (dt / 2)
+        s = 2 * t / (1 + np.sum(t * t, axis=-1, keepdims=True))
+        v_prime = v_minus + np.cross(v_minus, t)
+        v_plus = v_minus + np.cross(v_prime, s)
+    v_new = v_plus + qm * E3 * (dt / 2)
+
+    # move in the Cartesian plane (radial, azimuthal) at the old azimuth
+    step = v_new * dt
+    radial = x[:, 1] + step[:, 1]
+    azimuthal = step[:, 2]
+    r = np.hypot(radial, azimuthal)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos = np.where(r > 0, radial / r, 1)
+        sin = np.where(r > 0, azimuthal / r, 0)
+
+    x_new = np.column_stack((x[:, 0] + step[:, 0], r))
+    v_out = np.column_stack(
+        (
+            v_new[:, 0],
+            cos * v_new[:, 1] + sin * v_new[:, 2],
+            cos * v_new[:, 2] - sin * v_new[:, 1],
+        )
+    )
+    return x_new.astype(x.dtype, copy=False), v_out.astype(v.dtype, copy=False)
+
+
+PUSHERS = {
+    "euler": euler,
+    "rk4": rk4,
+    "leapfrog": leapfrog,
+    "boris": boris,
+    "tajima_implicit": tajima_implicit,
+    "tajima_explicit": tajima_explicit,
+}
+
+# Pushers of axisymmetric (z, r) runs, with velocities (v_z, v_r, v_theta)
+RZ_PUSHERS = {"boris": boris_rz}
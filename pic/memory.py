@@ -0,0 +1,237 @@
+"""Memory a resolution needs, estimated before the run.
+
+Run as ``python -m pic.memory --h 5e-5`` to print the bytes of every
+component of the field of ``python -m pic`` at that spacing without
+assembling or solving it, and with ``--measure`` next to the bytes
+reported by ``ElectricField.memory_report`` after building it.
+
+The sparse operator, its assembly triplets and, without space charge, the
+LU factors or multigrid hierarchy are freed after the initial solve, so they
+count towards the peak at start-up only.
+"""
+
+import argparse
+
+import numpy as np
+from scipy.sparse.linalg import splu
+
+from .grid import Grid
+
+# Largest grid whose LU factors are estimated by factoring it outright
+CALIBRATION_NODES = 25000
+
+COMPONENTS = (
+    "axes",
+    "operator",
+    "assembly",
+    "rhs",
+    "basis",
+    "fields",
+    "space charge",
+    "interleaved",
+    "masks",
+    "solver",
+    "particles",
+)
+
+
+def node_counts(grid):
+    """
+    Count the nodes of each type of ``Grid.get_node_types`` from the 1D axes.
+
+    Returns:
+        dict: Number of "dirichlet", "bottom", "top" and "interior" nodes.
+    """
+    h = grid.h_min
+    x = grid.x_index[1:-1]
+    in_wall = (x >= int(grid.x_wall / h)) & (x <= int((grid.x_wall + grid.w_wall) / h))
+    wall_columns = int(in_wall.sum())
+    wall_rows = int((grid.y_index <= int(grid.h_wall / h)).sum())
+    free_columns = grid.Nx - 2 - wall_columns
+
+    dirichlet = 2 * grid.Ny + wall_columns * wall_rows
+    bottom = free_columns
+    top = free_columns + (wall_columns if wall_rows < grid.Ny else 0)
+    if grid.Ny == 1:
+        top = 0
+    interior = grid.Nx * grid.Ny - dirichlet - bottom - top
+    return {"dirichlet": dirichlet, "bottom": bottom, "top": top, "interior": interior}
+
+
+def operator_nnz(grid):
+    """Return the number of stored entries of ``grid.get_A()``."""
+    n = node_counts(grid)
+    per_bottom = 4 if grid.axisymmetric else 2
+    return n["dirichlet"] + per_bottom * n["bottom"] + 2 * n["top"] + 5 * n["interior"]
+
+
+def scaled_grid(grid, factor):
+    """Return the grid of the same geometry with all spacings times factor."""
+    return Grid(
+        grid.h * factor,
+        grid.length,
+        grid.height,
+        grid.h_wall,
+        grid.w_wall,
+        grid.x_wall,
+        grid.Vin,
+        grid.Vout,
+        grid.Vwall,
+        refine=grid.refine,
+        refine_width=grid.refine_width * factor,
+        axisymmetric=grid.axisymmetric,
+    )
+
+
+def lu_nnz(grid):
+    """
+    Estimate the number of entries of the LU factors of ``grid.get_A()``.
+
+    Grids up to ``CALIBRATION_NODES`` nodes are factored. Larger ones are
+    extrapolated from the factors of the same geometry at two coarser
+    spacings, taking the fill to grow as a power of the number of nodes.
+    The fill grows slightly slower at finer spacings, so the extrapolation
+    errs high.
+    """
+    n = grid.Nx * grid.Ny
+    if n <= CALIBRATION_NODES:
+        return splu(grid.get_A().tocsc()).nnz
+    factor = 2.0 ** np.ceil(np.log2(np.sqrt(n / CALIBRATION_NODES)))
+    samples = []
+    for f in (2 * factor, factor):
+        coarse = scaled_grid(grid, f)
+        samples.append((coarse.Nx * coarse.Ny, splu(coarse.get_A().tocsc()).nnz))
+    (n0, nnz0), (n1, nnz1) = samples
+    power = np.log(nnz1 / nnz0) / np.log(n1 / n0)
+    return int(nnz1 * (n / n1) ** power)
+
+
+def multigrid_bytes(grid):
+    """
+    Estimate ``MultigridSolver.nbytes``: five masks, a diagonal and the x and
+    y couplings per node and level.
+    """
+    total = 0
+    nx, ny = grid.Nx, grid.Ny
+    while True:
+        total += 13 * nx * ny + 8 * ((nx - 1) * ny + nx * (ny - 1))
+        if min(nx, ny) <= 4:
+            break
+        nx, ny = nx // 2 + 1, ny // 2 + 1
+    return total
+
+
+def estimate_memory(
+    grid, solver="spsolve", dtype=np.float64, space_charge=False, n_particles=0
+):
+    """
+    Estimate the bytes of each component of a run on a grid.
+
+    Only the 1D axes of the grid are read; nothing of the size of the grid
+    is allocated except to factor the coarse grids of ``lu_nnz``.
+
+    Args:
+        grid (Grid): Grid of the run, not yet assembled.
+        solver (str): Poisson solver of ``ElectricField``.
+        dtype (numpy.dtype): Precision of the particle state and the
+            interleaved fields.
+        space_charge (bool): Whether the run keeps the solver and the space
+            charge fields.
+        n_particles (int): Number of particles stored.
+
+    Returns:
+        dict: Bytes of each of ``COMPONENTS``, with the keys of
+            ``ElectricField.memory_report`` plus the transient "assembly"
+            triplets and the "particles".
+    """
+    itemsize = np.dtype(dtype).itemsize
+    n = grid.Nx * grid.Ny
+    report = dict.fromkeys(COMPONENTS, 0)
+    report["axes"] = grid.memory_report()["axes"]
+    if solver == "spsolve":
+        nnz = operator_nnz(grid)
+        # float64 values and int32 column indices and row pointers
+        report["operator"] = 12 * nnz + 4 * (n + 1)
+        # int32 rows and columns and float64 values
+        report["assembly"] = 16 * nnz
+        report["rhs"] = 8 * n
+        report["solver"] = 12 * lu_nnz(grid) + 8 * n
+    else:
+        report["solver"] = multigrid_bytes(grid)
+    report["basis"] = 9 * 8 * n
+    report["fields"] = 3 * 8 * n
+    if space_charge:
+        # the space charge fields and their sums with the electrode fields
+        report["space charge"] = 3 * 8 * n
+        report["fields"] += 3 * 8 * n
+    report["interleaved"] = 3 * itemsize * n
+    report["masks"] = n
+    velocity_columns = 3 if grid.axisymmetric else 2
+    report["particles"] = n_particles * ((2 + velocity_columns) * itemsize + 8)
+    return report
+
+
+def format_report(*reports, names=None):
+    """
+    Return a table of memory reports in MB, one column per report.
+
+    Args:
+        reports (dict): Bytes per component.
+        names (list): Column headers.
+    """
+    names = names or [""] * len(reports)
+    keys = [k for k in COMPONENTS if any(k in r for r in reports)]
+    keys += [k for r in reports for k in r if k not in keys]
+    lines = [f"{'':14}" + "".join(f"{name:>12}" for name in names)]
+    for key in keys:
+        cells = "".join(
+            f"{r[key] / 1e6:>12.2f}" if key in r else f"{'-':>12}" for r in reports
+        )
+        lines.append(f"{key:14}{cells}")
+    lines.append(f"{'total (MB)':14}" + "".join(f"{sum(r.values()) / 1e6:>12.2f}" for r in reports))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from .defaults import H, make_grid
+    from .field import SOLVERS, ElectricField
+
+    parser = argparse.ArgumentParser(prog="python -m pic.memory")
+    parser.add_argument("--h", type=float, default=H)
+    parser.add_argument("--refine", type=int, default=1)
+    parser.add_argument("--refine-width", type=float, default=None)
+    parser.add_argument("--axisymmetric", action="store_true")
+    parser.add_argument("--solver", default="spsolve", choices=SOLVERS)
+    parser.add_argument("--precision", default="float64", choices=("float64", "float32"))
+    parser.add_argument("--space-charge", action="store_true")
+    parser.add_argument("--particles", type=int, default=0)
+    parser.add_argument(
+        "--measure",
+        action="store_true",
+        help="also build the field and report what it holds",
+    )
+    args = parser.parse_args()
+
+    grid = make_grid(
+        args.h,
+        refine=args.refine,
+        refine_width=args.refine_width,
+        axisymmetric=args.axisymmetric,
+    )
+    print(f"{grid.Nx} x {grid.Ny} nodes")
+    reports = [
+        estimate_memory(
+            grid, args.solver, args.precision, args.space_charge, args.particles
+        )
+    ]
+    names = ["estimate"]
+    if args.measure:
+        field = ElectricField(
+            grid,
+            solver=args.solver,
+            space_charge=args.space_charge,
+            dtype=args.precision,
+        )
+        reports.append(field.memory_report())
+        names.append("measured")
+    print(format_report(*reports, names=names))
@@ -0,0 +1,246 @@
+"""Multi-process particle push over shared-memory field and particle arrays."""
+
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import numpy as np
+
+from .field import ElectricField
+from .particle import advance
+
+
+class _FieldView:
+    """Field arrays in shared memory with the gather of ElectricField."""
+
+    gather = ElectricField.gather
+    _cell_weights = ElectricField._cell_weights
+
+    def __init__(self, V, F, grid):
+        self.V = V
+        self._F = F
+        self.grid = grid
+
+
+def _attach(name, shape, dtype):
+    """Return a shared memory block and an array view of it."""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _release(shm):
+    """Close a shared memory block, unless an array still uses it."""
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+
+def _worker(conn, field_spec, grid, backend):
+    """Push chunks of the shared particle arrays on request until stopped."""
+    try:
+        import numba
+
+        # the pool provides the parallelism, keep each worker single threaded
+        numba.set_num_threads(1)
+    except ImportError:
+        pass
+
+    (shm_V, V), (shm_F, F) = [_attach(*spec) for spec in field_spec]
+    field = _FieldView(V, F, grid)
+    blocks = []
+    positions = velocities = flags = wall_points = None
+    while True:
+        cmd, *args = conn.recv()
+        if cmd == "stop":
+            break
+        try:
+            if cmd == "particles":
+                positions = velocities = flags = wall_points = None
+                for shm in blocks:
+                    _release(shm)
+                blocks, arrays = zip(*[_attach(*spec) for spec in args[0]])
+                positions, velocities, flags, wall_points = arrays
+                conn.send(None)
+            elif cmd == "push":
+                start, stop, pusher, qm, dt, B = args
+                right, wall, inlet = advance(
+                    positions[start:stop],
+                    velocities[start:stop],
+                    pusher,
+                    field,
+                    qm,
+                    dt,
+                    grid,
+                    B,
+                    backend,
+                    wall_points[start:stop],
+                )
+                flags[start:stop] = right + 2 * wall + 4 * inlet
+                conn.send(None)
+        except Exception as e:
+            conn.send(e)
+
+    field = V = F = positions = velocities = flags = wall_points = arrays = None
+    for shm in (shm_V, shm_F) + tuple(blocks):
+        _release(shm)
+
+
+class SharedMemoryPool:
+    """Persistent process pool pushing fixed chunks of the particles."""
+
+    def __init__(self, electric_field, grid, n_workers=None, backend="auto"):
+        """
+        Start the worker processes.
+
+        The potential and the interleaved field array of ``electric_field``
+        and the particle state arrays live in shared memory, so a step only
+        sends each worker its chunk bounds. The field is copied into shared
+        memory again only when ``electric_field`` recomputes it (new voltages
+        or space charge).
+
+        Args:
+            electric_field (ElectricField): Electric field of the run.
+            grid (Grid): Grid class.
+            n_workers (int): Number of processes, by default the CPU count.
+            backend (str): Push backend of the workers, see ``Particles``.
+        """
+        self.n_workers = n_workers or os.cpu_count()
+        self._shm = {}
+        self._particle_arrays = None
+        self._particle_names = []
+
+        V, spec_V = self._share(electric_field.V)
+        F, spec_F = self._share(electric_field._F)
+        self._field_arrays = (V, F)
+        self._field = electric_field._F
+
+        geometry = SimpleNamespace(
+            h=grid.h,
+            uniform=grid.uniform,
+            axisymmetric=grid.axisymmetric,
+            ys=grid.ys,
+            h_min=grid.h_min,
+            x_index=grid.x_index,
+            y_index=grid.y_index,
+            x_cells=grid.x_cells,
+            y_cells=grid.y_cells,
+            x_wall=grid.x_wall,
+            w_wall=grid.w_wall,
+            h_wall=grid.h_wall,
+            height=grid.height,
+            length=grid.length,
+        )
+        ctx = mp.get_context("spawn")
+        self._conns = []
+        self._procs = []
+        for _ in range(self.n_workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(
+                target=_worker,
+                args=(child, [spec_V, spec_F], geometry, backend),
+                daemon=True,
+            )
+            proc.start()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+    def _share(self, arr):
+        """Copy an array into a new shared memory block.
+
+        Returns:
+            tuple: The shared array and what a worker needs to attach to it.
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+        view[...] = arr
+        self._shm[shm.name] = shm
+        return view, (shm.name, arr.shape, arr.dtype.str)
+
+    def _free(self, names):
+        """Release and remove the shared memory blocks with these names."""
+        for name in names:
+            shm = self._shm.pop(name)
+            _release(shm)
+            shm.unlink()
+
+    def _barrier(self, conns):
+        """Wait for every worker in conns and re-raise their errors."""
+        errors = [conn.recv() for conn in conns]
+        for err in errors:
+            if err is not None:
+                raise err
+
+    def _share_particles(self, particles):
+        """Move the particle storage into shared memory if it is not there."""
+        if self._particle_arrays is not None and particles._positions is self._particle_arrays[0]:
+            return
+        old = self._particle_names
+        self._particle_arrays = None
+
+        arrays, specs = zip(
+            *[
+                self._share(arr)
+                for arr in (
+                    particles._positions,
+                    particles._velocities,
+                    np.zeros(len(particles._ids), dtype=np.uint8),
+                    np.zeros_like(particles._positions),
+                )
+            ]
+        )
+        self._particle_arrays = arrays
+        self._particle_names = [spec[0] for spec in specs]
+        particles._positions, particles._velocities = arrays[:2]
+        for conn in self._conns:
+            conn.send(("particles", list(specs)))
+        self._barrier(self._conns)
+        self._free(old)
+
+    def advance(self, particles, pusher, electric_field, dt, grid, B=None, wall_points=None):
+        """
+        Advance the particles in parallel, see ``pic.particle.advance``.
+
+        Called by ``Particles.push`` when it is given this pool. ``B`` must
+        be None or a uniform field, since functions are not shared.
+        ``wall_points`` gets the wall hit points as in ``advance``.
+        """
+        if electric_field._F is not self._field:
+            V, F = self._field_arrays
+            V[...] = electric_field.V
+            F[...] = electric_field._F
+            self._field = electric_field._F
+        self._share_particles(particles)
+
+        bounds = np.linspace(0, particles.num, self.n_workers + 1).astype(int)
+        qm = particles.Q / particles.M
+        busy = []
+        for conn, start, stop in zip(self._conns, bounds[:-1], bounds[1:]):
+            if stop > start:
+                conn.send(("push", start, stop, pusher, qm, dt, B))
+                busy.append(conn)
+        self._barrier(busy)
+
+        flags = self._particle_arrays[2][: particles.num]
+        if wall_points is not None:
+            wall_points[...] = self._particle_arrays[3][: particles.num]
+        return (flags & 1) > 0, (flags & 2) > 0, (flags & 4) > 0
+
+    def close(self, particles=None):
+        """
+        Stop the workers and free the shared memory.
+
+        Args:
+            particles (Particles): Particles pushed with this pool, whose
+                storage is copied out of shared memory first.
+        """
+        if particles is not None and self._particle_arrays is not None:
+            particles._positions = np.array(particles._positions)
+            particles._velocities = np.array(particles._velocities)
+        for conn in self._conns:
+            conn.send(("stop",))
+        for proc in self._procs:
+            proc.join()
+        self._field_arrays = self._particle_arrays = self._field = None
+        self._free(list(self._shm))
@@ -2,73 +2,569 @@
 
 import numpy as np
 
+from . import kernels
+from .boundary import collide
+from .integrator import PUSHERS, RZ_PUSHERS, boris, boris_rz, euler, leapfrog, rk4
+from .timing import TIMERS
+
 # Single Xenon ion charge and mass
 Q = 1.60217657e-19
 M = 131.293 * 1.66053892 * 1e-27
 
 
+def _fields(electric_field, B):
+    """Return the field function of the pushers for an electric field and B."""
+    if callable(B):
+        return lambda pos: (electric_field.gather(pos), B(pos))
+    return lambda pos: (electric_field.gather(pos), B)
+
+
+def advance(
+    positions,
+    velocities,
+    pusher,
+    electric_field,
+    qm,
+    dt,
+    grid,
+    B=None,
+    backend="auto",
+    wall_points=None,
+):
+    """
+    Advance particle arrays in place by one step and apply the boundaries.
+
+    The pusher is called once on the whole (N, 2) position and velocity
+    arrays, then the path of each particle over the step is reflected at
+    the top and bottom boundaries and at the faces of the biased wall by
+    ``pic.boundary.collide``, and stops at the outlet and at the inlet.
+    With the numba backend the gather, the pusher and the boundary handling
+    run fused in one compiled loop.
+
+    Args:
+        positions (numpy.ndarray): (N, 2) positions, updated in place.
+        velocities (numpy.ndarray): (N, 2) velocities, updated in place.
+        pusher (callable): Particle pusher function from ``pic.integrator``.
+        electric_field (ElectricField): Electric field object.
+        qm (float): Charge to mass ratio of the particles.
+        dt (float): Time step.
+        grid (Grid): Grid class.
+        B (numpy.ndarray or callable): Optional magnetic field.
+        backend (str): "auto", "numpy" or "numba", see ``Particles``.
+        wall_points (numpy.ndarray): Optional (N, 2) array, set for the
+            particles hitting the wall to the point of their first hit.
+
+    Returns:
+        tuple: Boolean masks of the particles that reached the outlet, of
+            those that hit the biased wall and of those that left through
+            the inlet.
+    """
+    kernel_grid = grid.uniform and not grid.axisymmetric
+    if backend != "numpy" and kernel_grid and kernels.supports(pusher, B):
+        # the kernel fuses gather, push and boundaries into one phase
+        with TIMERS.phase("push"):
+            flags = kernels.push(
+                positions, velocities, electric_field, qm, dt, grid, pusher, B, wall_points
+            )
+        return (
+            (flags & kernels.OUTLET) > 0,
+            (flags & kernels.WALL) > 0,
+            (flags & kernels.INLET) > 0,
+        )
+    if backend == "numba":
+        if not kernel_grid:
+            raise ValueError("The numba backend needs a uniform planar grid.")
+        raise ValueError(f"The numba backend does not support {pusher.__name__}.")
+
+    fields = _fields(electric_field, B)
+    with TIMERS.phase("push"):
+        x_new, v_new = pusher(positions, velocities, fields, qm, dt)
+    with TIMERS.phase("boundary"):
+        right_boundary, wall, inlet = collide(positions, x_new, v_new, grid, wall_points)
+        np.copyto(positions, x_new)
+        np.copyto(velocities, v_new)
+    return right_boundary, wall, inlet
+
+
+def _spread_bits(v):
+    """Insert a zero bit above each of the low 32 bits of v (uint64)."""
+    v = v & np.uint64(0x00000000FFFFFFFF)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def sort_keys(positions, electric_field, order="cell"):
+    """
+    Return the sort key of each position for a cache friendly particle order.
+
+    Args:
+        positions (numpy.ndarray): (N, 2) particle positions.
+        electric_field (ElectricField): Field whose grid cells are used.
+        order (str): "cell" for the row-major cell index used by the gather,
+            or "morton" for the Z-order curve through the cells, which also
+            keeps neighbouring rows close.
+
+    Returns:
+        numpy.ndarray: (N,) integer keys.
+    """
+    k, _, _ = electric_field._cell_weights(positions)
+    if order == "cell":
+        return k
+    if order == "morton":
+        nx = electric_field.V.shape[1]
+        i = (k % nx).astype(np.uint64)
+        j = (k // nx).astype(np.uint64)
+        return _spread_bits(i) | (_spread_bits(j) << np.uint64(1))
+    raise ValueError(f"Unknown sort order {order!r}.")
+
+
+class Subcycling:
+    """Per-particle time steps as power of two subdivisions of the step."""
+
+    # Order of the position error of the pushers with error control
+    ORDERS = {euler: 1, leapfrog: 2, boris: 2, boris_rz: 2, rk4: 4}
+
+    def __init__(self, max_level=4, cfl=1.0, tol=None):
+        """
+        Initialize the subcycling.
+
+        Every push, each particle gets a level L and advances in 2**L
+        substeps of dt / 2**L, so that it moves at most ``cfl`` cells per
+        substep and its displacement due to the field stays within ``cfl``
+        cells. Particles of one level are advanced together, so the work
+        stays vectorized and all particles end the push at the same time.
+
+        Args:
+            max_level (int): Largest level, dt / 2**max_level is the smallest
+                substep.
+            cfl (float): Fraction of a cell a particle may cross per substep.
+            tol (float): Optional local error tolerance as a fraction of the
+                cell size. The level is raised until the step doubling
+                estimate of the position error of the first substep is below
+                it; needs a pusher in ``ORDERS``, such as ``rk4``.
+        """
+        self.max_level = max_level
+        self.cfl = cfl
+        self.tol = tol
+        self.levels = np.zeros(0, dtype=np.intp)
+        self.n_pushes = 0
+
+    def select_levels(
+        self, positions, velocities, pusher, electric_field, qm, dt, grid, B=None
+    ):
+        """Return the subcycling level of every particle for a step dt."""
+        h = grid.h_min
+        # all velocity components, v_theta included in (z, r) mode
+        speed = np.linalg.norm(velocities, axis=1)
+        E = electric_field.gather(positions)
+        accel = abs(qm) * np.hypot(E[:, 0], E[:, 1])
+        with np.errstate(divide="ignore"):
+            dt_local = self.cfl * np.minimum(h / speed, np.sqrt(2 * h / accel))
+            if B is not None:
+                # resolve the gyration, at most cfl radians per substep, with
+                # |B| at each particle when B varies in space
+                B_norm = np.linalg.norm(B(positions) if callable(B) else B, axis=-1)
+                dt_local = np.minimum(dt_local, self.cfl / np.abs(qm * B_norm))
+            levels = np.ceil(np.log2(dt / dt_local))
+        levels = np.clip(levels, 0, self.max_level).astype(np.intp)
+
+        if self.tol is not None:
+            if pusher not in self.ORDERS:
+                raise ValueError(f"No error control for {pusher.__name__}.")
+            factor = 2 ** self.ORDERS[pusher] - 1
+            fields = _fields(electric_field, B)
+            check = np.flatnonzero(levels < self.max_level)
+            while len(check):
+                x, v = positions[check], velocities[check]
+                dt_sub = (dt / 2.0 ** levels[check])[:, None]
+                x1, _ = pusher(x, v, fields, qm, dt_sub)
+                x_half, v_half = pusher(x, v, fields, qm, dt_sub / 2)
+                x2, _ = pusher(x_half, v_half, fields, qm, dt_sub / 2)
+                err = np.hypot(*(x1 - x2).T) / factor
+                check = check[err > self.tol * h]
+                levels[check] += 1
+                check = check[levels[check] < self.max_level]
+        return levels
+
+    def advance(
+        self,
+        positions,
+        velocities,
+        pusher,
+        electric_field,
+        qm,
+        dt,
+        grid,
+        B=None,
+        backend="auto",
+        wall_points=None,
+    ):
+        """
+        Advance particle arrays in place by dt with subcycling.
+
+        Takes the arguments of ``advance`` and returns the same masks, and
+        ``wall_points`` gets the first wall hit over all substeps.
+        Particles stop at the substep in which they reach the outlet or the
+        inlet. The
+        number of substeps taken is stored in ``n_pushes`` and the levels
+        in ``levels``.
+        """
+        levels = self.select_levels(
+            positions, velocities, pusher, electric_field, qm, dt, grid, B
+        )
+        right_boundary = np.zeros(len(positions), dtype=bool)
+        wall = np.zeros(len(positions), dtype=bool)
+        inlet = np.zeros(len(positions), dtype=bool)
+        self.levels = levels
+        self.n_pushes = 0
+        for level in np.unique(levels):
+            idx = np.flatnonzero(levels == level)
+            x = positions[idx]
+            v = velocities[idx]
+            active = np.arange(len(idx))
+            buffer = None if wall_points is None else np.empty((len(idx), 2), x.dtype)
+            for _ in range(2**level):
+                points = None if buffer is None else buffer[: len(active)]
+                step = (pusher, electric_field, qm, dt / 2**level, grid, B, backend, points)
+                if len(active) == len(idx):
+                    right, hit, left = advance(x, v, *step)
+                else:
+                    xa, va = x[active], v[active]
+                    right, hit, left = advance(xa, va, *step)
+                    x[active] = xa
+                    v[active] = va
+                self.n_pushes += len(active)
+                if wall_points is not None:
+                    # keep the first hit of the step
+                    first = hit & ~wall[idx[active]]
+                    wall_points[idx[active[first]]] = points[first]
+                wall[idx[active[hit]]] = True
+                right_boundary[idx[active[right]]] = True
+                inlet[idx[active[left]]] = True
+                active = active[~(right | left)]
+                if not len(active):
+                    break
+            positions[idx] = x
+            velocities[idx] = v
+        return right_boundary, wall, inlet
+
+
+class Injector:
+    """Continuous source of particles at the inlet."""
+
+    def __init__(
+        self, rate, height, v0=20, v_th=0.0, y_range=None, seed=None, axisymmetric=False
+    ):
+        """
+        Initialize the injector.
+
+        Args:
+            rate (float): Number of particles injected per second.
+            height (float): Height of the simulation domain.
+            v0 (float): Mean velocity of the injected particles along x.
+            v_th (float): Standard deviation of each velocity component.
+            y_range (tuple): Range of injection heights, by default the
+                whole inlet.
+            seed (int): Seed of the random number generator.
+            axisymmetric (bool): Inject through the disk of an axisymmetric
+                inlet, with radii distributed so the beam is uniform over its
+                area.
+        """
+        self.rate = rate
+        self.axisymmetric = axisymmetric
+        self.v0 = v0
+        self.v_th = v_th
+        self.y_range = (0, height) if y_range is None else y_range
+        self.rng = np.random.default_rng(seed)
+        self._carry = 0.0
+
+    def sample(self, dt):
+        """Return the positions and velocities of the particles injected during dt."""
+        self._carry += self.rate * dt
+        n = int(self._carry)
+        self._carry -= n
+
+        positions = np.zeros((n, 2))
+        if self.axisymmetric:
+            r0, r1 = self.y_range
+            positions[:, 1] = np.sqrt(self.rng.uniform(r0**2, r1**2, n))
+        else:
+            positions[:, 1] = self.rng.uniform(*self.y_range, n)
+        velocities = self.rng.normal(0.0, self.v_th, (n, 2)) if self.v_th else np.zeros((n, 2))
+        velocities[:, 0] += self.v0
+        # particles leaving the inlet must move into the domain
+        velocities[:, 0] = np.abs(velocities[:, 0])
+        return positions, velocities
+
+
 class Particles:
     """Class representing a collection of particles in a PIC simulation."""
 
-    def __init__(self, n_particles, height, v0=20):
+    def __init__(
+        self,
+        n_particles,
+        height,
+        v0=20,
+        injector=None,
+        absorb_wall=False,
+        capacity=None,
+        backend="auto",
+        subcycling=None,
+        sort_every=0,
+        sort_order="cell",
+        dtype=np.float64,
+        axisymmetric=False,
+    ):
         """
         Initialize the particle object with random positions and velocities.
 
+        Particles are stored in arrays with spare capacity: the first ``num``
+        rows are the live particles, absorbed particles are removed by moving
+        particles from the end into their slots, so the order of particles is
+        not preserved across a push. ``ids`` identifies each particle.
+
         Args:
             n_particles (int): Number of particles to create.
             height (float): Height of the simulation domain.
+            v0 (float): Initial velocity of the particles along x.
+            injector (Injector): Optional source adding particles every push.
+            absorb_wall (bool): Remove particles hitting the biased wall
+                instead of reflecting them. Hits are counted in
+                ``n_wall_hits`` either way, and ``last_events`` holds the ids,
+                positions and velocities of the particles that reached the
+                outlet, hit the wall or left through the inlet during the
+                last push. The positions of the wall events are the points
+                where the particles first hit the wall. Particles leaving
+                through the inlet are always removed.
+            capacity (int): Initial size of the storage arrays.
+            backend (str): "numba" for the compiled kernel of ``pic.kernels``,
+                "numpy" for whole-array NumPy operations, or "auto" to use the
+                kernel whenever numba is installed and the pusher supports it.
+            subcycling (Subcycling): Optional per-particle subdivision of the
+                step. ``n_pushes`` counts the particle pushes either way.
+            sort_every (int): Reorder the particles by grid cell every this
+                many pushes (0 never), see ``sort``.
+            sort_order (str): Order of the sort, "cell" or "morton".
+            dtype (numpy.dtype): Precision of the positions and velocities,
+                float32 halves the memory moved by the push. The NumPy push
+                computes in this precision, the numba kernel only stores in
+                it and computes in float64.
+            axisymmetric (bool): Particles of an axisymmetric grid, at
+                positions (z, r) with velocities (v_z, v_r, v_theta), pushed
+                by the pushers of ``RZ_PUSHERS``.
         """
+        if backend not in ("auto", "numpy", "numba"):
+            raise ValueError(f"Unknown backend {backend!r}.")
+        if backend == "numba" and not kernels.available():
+            raise ImportError("The numba backend requires numba to be installed.")
 
         self.num = n_particles
+        self.backend = backend
         self.Q = Q
         self.M = M
-        self.positions = np.zeros((n_particles, 2))
+        self.injector = injector
+        self.absorb_wall = absorb_wall
+        self.time = 0.0
+        self.n_injected = n_particles
+        self.n_absorbed = {"outlet": 0, "wall": 0, "inlet": 0}
+        self.last_absorbed = {"outlet": 0, "wall": 0, "inlet": 0}
+        self.n_wall_hits = 0
+        self.n_pushes = 0
+        self.last_events = {}
+        self.subcycling = subcycling
+        self.sort_every = sort_every
+        self.sort_order = sort_order
+        self.n_steps = 0
+        self.axisymmetric = axisymmetric
+
+        capacity = max(n_particles, capacity or 0, 1)
+        self._positions = np.zeros((capacity, 2), dtype=dtype)
+        self._velocities = np.zeros((capacity, 3 if axisymmetric else 2), dtype=dtype)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        # scratch for the wall hit points of a push, sized like the storage
+        self._wall_points = np.empty_like(self._positions)
         self.positions[:, 1] = np.linspace(
             height / 10, height, n_particles, endpoint=False
         )
-        self.velocities = np.zeros((n_particles, 2))
         self.velocities[:, 0] = v0
+        self.ids[:] = np.arange(n_particles)
+
+    @property
+    def positions(self):
+        """(num, 2) view of the live particle positions."""
+        return self._positions[: self.num]
+
+    @property
+    def velocities(self):
+        """(num, 2) view of the live particle velocities, (num, 3) when axisymmetric."""
+        return self._velocities[: self.num]
+
+    @property
+    def ids(self):
+        """(num,) view of the ids of the live particles."""
+        return self._ids[: self.num]
+
+    def inject(self, positions, velocities):
+        """Append new particles, growing the storage if needed."""
+        n = len(positions)
+        if self.num + n > len(self._ids):
+            capacity = max(2 * len(self._ids), self.num + n)
+            for name in ("_positions", "_velocities", "_ids"):
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[: self.num] = old[: self.num]
+                setattr(self, name, new)
+
+        sl = slice(self.num, self.num + n)
+        self._positions[sl] = positions
+        # components not given (v_theta of planar velocities) start at zero
+        d = np.shape(velocities)[1]
+        self._velocities[sl, :d] = velocities
+        self._velocities[sl, d:] = 0
+        self._ids[sl] = np.arange(self.n_injected, self.n_injected + n)
+        self.num += n
+        self.n_injected += n
 
-    def push(self, pusher, electric_field, dt, grid):
+    def remove(self, mask):
         """
-        Push particles using the specified pusher function.
+        Remove the particles selected by a boolean mask over the live particles.
+
+        The holes left below the new particle count are filled with the
+        surviving particles above it, so the cost follows the number removed.
+        """
+        n_new = self.num - np.count_nonzero(mask)
+        holes = np.flatnonzero(mask[:n_new])
+        movers = n_new + np.flatnonzero(~mask[n_new:])
+        for arr in (self._positions, self._velocities, self._ids):
+            arr[holes] = arr[movers]
+        self.num = n_new
+
+    def sort(self, electric_field, order=None):
+        """
+        Reorder the live particles by grid cell.
+
+        Particles in the same or neighbouring cells then read the same field
+        values in the gather, which keeps them in cache for large particle
+        counts. The arrays are permuted in place (so shared memory stays
+        shared) and ``ids`` moves with the particles.
 
         Args:
-            pusher (callable): Particle pusher function.
-            electric_field (callable): Electric field function.
+            electric_field (ElectricField): Field whose grid cells are used.
+            order (str): "cell" or "morton", by default ``sort_order``.
+        """
+        keys = sort_keys(self.positions, electric_field, order or self.sort_order)
+        perm = np.argsort(keys, kind="stable")
+        for arr in (self.positions, self.velocities, self.ids):
+            arr[...] = arr[perm]
+
+    def get_fluxes(self):
+        """Return the absorbed particles per second at each boundary."""
+        if self.time == 0:
+            return {k: 0.0 for k in self.n_absorbed}
+        return {k: n / self.time for k, n in self.n_absorbed.items()}
+
+    def push(self, pusher, electric_field, dt, grid, B=None, pool=None):
+        """
+        Push all particles at once using the specified pusher function.
+
+        The state arrays are advanced in place by ``advance``. Particles
+        reaching the outlet or the inlet (and the wall if ``absorb_wall`` is
+        set) are then removed, and the injector adds new particles at the inlet.
+
+        Args:
+            pusher (callable or str): Particle pusher function from
+                ``pic.integrator`` or its name in ``PUSHERS`` (``RZ_PUSHERS``
+                when axisymmetric).
+            electric_field (ElectricField): Electric field object.
             dt (float): Time step.
             grid (Grid): Grid class.
+            B (numpy.ndarray or callable): Optional uniform magnetic field
+                (3-vector) or function returning it at an array of positions.
+            pool (SharedMemoryPool): Optional process pool from
+                ``pic.parallel`` pushing chunks of the particles in parallel.
         """
-        for i in range(self.num):
-            x = self.positions[i]
-            v = self.velocities[i]
-            a = lambda pos: Q * electric_field.get_field_at(pos) / M
-            x_new, v_new = pusher(x, v, a, dt)
-
-            bottom_boundary = (x_new[1] <= 0 and x_new[0] <= grid.x_wall) or (
-                x_new[1] <= 0 and x >= (grid.x_wall + grid.w_wall)
+        if isinstance(pusher, str):
+            pusher = (RZ_PUSHERS if self.axisymmetric else PUSHERS)[pusher]
+        n_pushes = self.num
+        # filled only for the particles hitting the wall
+        if self._wall_points.shape != self._positions.shape:
+            self._wall_points = np.empty_like(self._positions)
+        wall_points = self._wall_points[: self.num]
+        if pool is not None:
+            if self.subcycling is not None:
+                raise ValueError("Subcycling is not supported with a process pool.")
+            with TIMERS.phase("push"):
+                right_boundary, wall, inlet = pool.advance(
+                    self, pusher, electric_field, dt, grid, B, wall_points
+                )
+        elif self.subcycling is not None:
+            right_boundary, wall, inlet = self.subcycling.advance(
+                self.positions,
+                self.velocities,
+                pusher,
+                electric_field,
+                self.Q / self.M,
+                dt,
+                grid,
+                B,
+                self.backend,
+                wall_points,
             )
-            top_boundary = x_new[1] >= grid.height
-            right_boundary = x_new[0] >= grid.length
-
-            left_wall = x_new[0] >= grid.x_wall
-            right_wall = x_new[0] <= (grid.x_wall + grid.w_wall)
-            top_wall = x_new[1] <= grid.h_wall
-            wall = left_wall and right_wall and top_wall
-
-            if top_boundary or bottom_boundary:
-                v_new[1] = -v_new[1]
-            elif right_boundary:
-                v_new = np.array([0, 0])
-            elif wall:
-                # if the particle passed throught the top wall
-                if x[1] >= grid.h_wall and x_new[1] <= grid.h_wall:
-                    v_new[1] = -v_new[1]
-                else:
-                    v_new[0] = -v_new[0]
+            n_pushes = self.subcycling.n_pushes
+        else:
+            right_boundary, wall, inlet = advance(
+                self.positions,
+                self.velocities,
+                pusher,
+                electric_field,
+                self.Q / self.M,
+                dt,
+                grid,
+                B,
+                self.backend,
+                wall_points,
+            )
+        self.time += dt
+        self.n_pushes += int(n_pushes)
+        TIMERS.count("particle pushes", int(n_pushes))
+        self.n_wall_hits += int(np.count_nonzero(wall))
+        # copies of the particles reaching the outlet, hitting the wall or
+        # leaving through the inlet, taken before the absorbed ones are removed
+        self.last_events = {
+            name: (self.ids[mask], self.positions[mask], self.velocities[mask])
+            for name, mask in (("outlet", right_boundary), ("inlet", inlet))
+        }
+        self.last_events["wall"] = (self.ids[wall], wall_points[wall], self.velocities[wall])
+
+        absorbed = right_boundary | inlet
+        if self.absorb_wall:
+            absorbed |= wall
+        self.last_absorbed = {
+            "outlet": int(np.count_nonzero(right_boundary)),
+            "wall": int(np.count_nonzero(wall)) if self.absorb_wall else 0,
+            "inlet": int(np.count_nonzero(inlet)),
+        }
+        for k, n in self.last_absorbed.items():
+            self.n_absorbed[k] += n
+        if absorbed.any():
+            with TIMERS.phase("boundary"):
+                self.remove(absorbed)
+
+        if self.injector is not None:
+            with TIMERS.phase("inject"):
+                self.inject(*self.injector.sample(dt))
 
-            self.positions[i] = x_new
-            self.velocities[i] = v_new
+        self.n_steps += 1
+        if self.sort_every and self.n_steps % self.sort_every == 0:
+            with TIMERS.phase("sort"):
+                self.sort(electric_field)
 
     def get_positions(self):
         """Return the particle positions."""
@@ -0,0 +1,134 @@
+"""Accuracy check of the float32 mode against float64.
+
+Run as ``python -m pic.precision`` to push the same particles in float64
+and float32 through the field of ``python -m pic`` and compare the energy
+conservation, the trajectories, the memory and the time of both.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from .defaults import H, make_grid
+from .field import ElectricField
+from .integrator import PUSHERS
+from .particle import Particles, Q, M
+
+
+def total_energy(particles, electric_field):
+    """Return the kinetic plus potential energy of each particle (eV), in float64."""
+    x = particles.positions.astype(np.float64)
+    v = particles.velocities.astype(np.float64)
+    _, V = electric_field.gather(x, potential=True)
+    return 0.5 * M * np.einsum("ij,ij->i", v, v) / Q + V.astype(np.float64)
+
+
+def run_precision(grid, dtype, n_particles, n_steps, pusher, dt, seed=0, cache=None):
+    """
+    Push random particles with fields and particle state in one precision.
+
+    Particles start uniformly over the free part of the domain with thermal
+    velocities. Reflections conserve energy, so the energy of every particle
+    still in the domain should stay constant.
+
+    Returns:
+        dict: ``ids``, ``positions`` and ``energy`` (eV) of the remaining
+            particles at the end, their initial ``energy0``, the push
+            ``time`` (s) and the ``bytes`` of the particle state and fields.
+    """
+    field = ElectricField(grid, dtype=dtype, cache=cache)
+    rng = np.random.default_rng(seed)
+    x = np.column_stack(
+        (
+            rng.uniform(0, grid.length, 2 * n_particles),
+            rng.uniform(0, grid.height, 2 * n_particles),
+        )
+    )
+    inside = (
+        (x[:, 0] >= grid.x_wall)
+        & (x[:, 0] <= grid.x_wall + grid.w_wall)
+        & (x[:, 1] <= grid.h_wall)
+    )
+    x = x[~inside][:n_particles]
+
+    particles = Particles(len(x), grid.height, dtype=dtype)
+    particles.positions[:] = x
+    particles.velocities[:] = rng.normal(0, 2e3, (len(x), 2))
+    energy0 = total_energy(particles, field)
+
+    n_bytes = particles.positions.nbytes + particles.velocities.nbytes + field._F.nbytes
+    t0 = time.perf_counter()
+    for _ in range(n_steps):
+        particles.push(pusher, field, dt, grid)
+    elapsed = time.perf_counter() - t0
+
+    ids = particles.ids
+    return {
+        "ids": ids.copy(),
+        "positions": particles.positions.astype(np.float64),
+        "energy": total_energy(particles, field),
+        "energy0": energy0[ids],
+        "time": elapsed,
+        "bytes": n_bytes,
+    }
+
+
+def compare_precision(
+    grid, n_particles=100000, n_steps=200, pusher="boris", dt=None, cache=None
+):
+    """
+    Compare a float32 run with the float64 run of the same particles.
+
+    Returns:
+        dict: For each precision the RMS and maximum energy drift relative
+            to the electrode voltage span, the push time and the bytes of
+            particle state and fields; and the RMS distance in cells between
+            the final positions of the particles left in both runs.
+    """
+    span = abs(grid.Vin - grid.Vout)
+    if dt is None:
+        dt = grid.h / np.sqrt(2 * Q * span / M)
+    pusher = PUSHERS[pusher] if isinstance(pusher, str) else pusher
+    runs = {
+        name: run_precision(grid, dtype, n_particles, n_steps, pusher, dt, cache=cache)
+        for name, dtype in (("float64", np.float64), ("float32", np.float32))
+    }
+    report = {}
+    for name, run in runs.items():
+        drift = (run["energy"] - run["energy0"]) / span
+        report[name] = {
+            "rms_drift": float(np.sqrt(np.mean(drift**2))),
+            "max_drift": float(np.abs(drift).max()),
+            "time": run["time"],
+            "bytes": run["bytes"],
+        }
+    _, i64, i32 = np.intersect1d(
+        runs["float64"]["ids"], runs["float32"]["ids"], return_indices=True
+    )
+    d = runs["float32"]["positions"][i32] - runs["float64"]["positions"][i64]
+    report["rms_distance"] = float(np.sqrt(np.mean(np.sum(d**2, axis=1)))) / grid.h
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m pic.precision")
+    parser.add_argument("pusher", nargs="?", default="boris", choices=sorted(PUSHERS))
+    parser.add_argument("--h", type=float, default=H)
+    parser.add_argument("--particles", type=int, default=100000)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--cache-dir", help="directory caching the solved fields")
+    args = parser.parse_args()
+
+    grid = make_grid(args.h)
+    report = compare_precision(
+        grid, args.particles, args.steps, args.pusher, cache=args.cache_dir
+    )
+    print(f"{'':10}{'rms drift':>12}{'max drift':>12}{'time (s)':>10}{'MB':>8}")
+    for name in ("float64", "float32"):
+        r = report[name]
+        print(
+            f"{name:10}{r['rms_drift']:>12.2e}{r['max_drift']:>12.2e}"
+            f"{r['time']:>10.3f}{r['bytes'] / 1e6:>8.1f}"
+        )
+    print(f"RMS distance between the final positions: {report['rms_distance']:.2e} cells")
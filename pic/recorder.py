@@ -0,0 +1,176 @@
+"""Streaming recorder of particle trajectories and energies."""
+
+import glob
+import os
+import queue
+import threading
+
+import numpy as np
+
+from .timing import timed
+
+
+class Recorder:
+    """Record a subset of particles to disk in chunks from a writer thread."""
+
+    def __init__(
+        self, directory, ids, stride=1, chunk_size=256, n_buffers=2, resume=None
+    ):
+        """
+        Initialize the recorder.
+
+        Samples are collected in preallocated chunk buffers. A full buffer is
+        handed to a background thread that saves it as ``chunk_XXXXXX.npz`` in
+        ``directory`` while the next one is filled, so at most ``n_buffers``
+        chunks are ever held in memory. Chunks left in ``directory`` by an
+        earlier recording are deleted, unless ``resume`` continues it.
+
+        Args:
+            directory (str): Output directory, created if needed.
+            ids (array_like): Ids of the particles to record. Particles that
+                are not alive at a sample are stored as NaN.
+            stride (int): Record every ``stride``-th step.
+            chunk_size (int): Number of samples per chunk file.
+            n_buffers (int): Number of chunk buffers, at least 2.
+            resume (dict): Offsets from ``state`` of an earlier recording in
+                ``directory`` to continue; its chunks written after that
+                state are deleted.
+        """
+        self.directory = directory
+        self.ids = np.unique(np.asarray(ids, dtype=np.int64))
+        self.stride = stride
+        self.chunk_size = chunk_size
+        self.n_samples = resume["n_samples"] if resume else 0
+        self.n_chunks = resume["n_chunks"] if resume else 0
+        os.makedirs(directory, exist_ok=True)
+        for f in glob.glob(os.path.join(directory, "chunk_*.npz")):
+            if int(os.path.basename(f)[6:-4]) >= self.n_chunks:
+                os.remove(f)
+        np.save(os.path.join(directory, "ids.npy"), self.ids)
+
+        self._free = queue.Queue()
+        for _ in range(max(n_buffers, 2) - 1):
+            self._free.put(self._new_buffer())
+        self._current = self._new_buffer()
+        self._fill = 0
+        self._error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def _new_buffer(self):
+        """Allocate the arrays of one chunk."""
+        n = len(self.ids)
+        return {
+            "step": np.zeros(self.chunk_size, dtype=np.int64),
+            "time": np.zeros(self.chunk_size),
+            "positions": np.zeros((self.chunk_size, n, 2)),
+            "energies": np.zeros((self.chunk_size, n)),
+        }
+
+    @timed("diagnostics")
+    def record(self, step, time, particles, electric_field):
+        """
+        Record the tracked particles if ``step`` falls on the stride.
+
+        Args:
+            step (int): Step number.
+            time (float): Simulation time.
+            particles (Particles): Particle collection.
+            electric_field (ElectricField): Field used for the potential energy.
+        """
+        if step % self.stride:
+            return
+
+        k = self._fill
+        buf = self._current
+        buf["step"][k] = step
+        buf["time"][k] = time
+        positions = buf["positions"][k]
+        energies = buf["energies"][k]
+        positions.fill(np.nan)
+        energies.fill(np.nan)
+
+        idx = np.searchsorted(self.ids, particles.ids)
+        idx = np.minimum(idx, max(len(self.ids) - 1, 0))
+        tracked = self.ids[idx] == particles.ids if len(self.ids) else idx < 0
+        if tracked.any():
+            r = particles.positions[tracked]
+            v = particles.velocities[tracked]
+            _, V = electric_field.gather(r, potential=True)
+            K = 0.5 * particles.M * np.einsum("ij,ij->i", v, v)
+            positions[idx[tracked]] = r
+            energies[idx[tracked]] = K + particles.Q * V
+
+        self._fill += 1
+        self.n_samples += 1
+        if self._fill == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the current chunk to the writer thread."""
+        if self._error is not None:
+            raise self._error
+        if self._fill == 0:
+            return
+        self._queue.put((self.n_chunks, self._current, self._fill))
+        self.n_chunks += 1
+        # blocks while all other buffers are still being written
+        self._current = self._free.get()
+        self._fill = 0
+
+    def _write_loop(self):
+        """Save chunks handed over by ``flush`` until told to stop."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            index, buf, n = item
+            try:
+                path = os.path.join(self.directory, f"chunk_{index:06d}.npz")
+                np.savez(path, **{k: v[:n] for k, v in buf.items()})
+            except Exception as e:
+                self._error = e
+            self._free.put(buf)
+            self._queue.task_done()
+
+    def sync(self):
+        """Write the current chunk and wait until every chunk is on disk."""
+        self.flush()
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def state(self):
+        """Return the offsets to resume this recording from, after ``sync``."""
+        return {"n_chunks": self.n_chunks, "n_samples": self.n_samples}
+
+    def close(self):
+        """Write the remaining samples and stop the writer thread."""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_recording(directory):
+    """
+    Load a recording written by ``Recorder``.
+
+    Returns:
+        dict: ``ids`` of the tracked particles and the concatenated ``step``,
+            ``time``, ``positions`` (samples, particles, 2) and ``energies``
+            (samples, particles) arrays.
+    """
+    data = {"ids": np.load(os.path.join(directory, "ids.npy"))}
+    chunks = [np.load(f) for f in sorted(glob.glob(os.path.join(directory, "chunk_*.npz")))]
+    for key in ("step", "time", "positions", "energies"):
+        data[key] = np.concatenate([c[key] for c in chunks]) if chunks else np.zeros(0)
+    return data
@@ -0,0 +1,99 @@
+"""Accuracy and cost of the graded grid against uniform grids.
+
+Run as ``python -m pic.refinement`` to solve the field of ``python -m pic``
+on a uniform coarse grid, on the same grid refined around the biased wall
+and on the uniform grid of the finest spacing, and compare each with a
+uniform reference twice finer still in the region around the wall.
+"""
+
+import argparse
+
+import numpy as np
+
+from .defaults import make_grid, solve
+
+
+def wall_region(grid, margin):
+    """Return a (Ny, Nx) mask of the nodes within ``margin`` of the wall block."""
+    x_lo = grid.x_wall - margin
+    x_hi = grid.x_wall + grid.w_wall + margin
+    return (grid.Xs >= x_lo) & (grid.Xs <= x_hi) & (grid.Ys <= grid.h_wall + margin)
+
+
+def field_errors(field, reference, margin):
+    """
+    Return the errors of a field in the wall region against a reference.
+
+    The reference is interpolated at the nodes of ``field`` within ``margin``
+    of the wall block.
+
+    Returns:
+        dict: Maximum and RMS error of the potential (V) and of the magnitude
+            of the electric field (V/m).
+    """
+    grid = field.grid
+    region = wall_region(grid, margin)
+    positions = np.column_stack((grid.Xs[region], grid.Ys[region]))
+    E_ref, V_ref = reference.gather(positions, potential=True)
+    dV = field.V[region] - V_ref
+    dE = np.hypot(field.Ex[region], field.Ey[region]) - np.hypot(*E_ref.T)
+    return {
+        "max_V": float(np.abs(dV).max()),
+        "rms_V": float(np.sqrt(np.mean(dV**2))),
+        "max_E": float(np.abs(dE).max()),
+        "rms_E": float(np.sqrt(np.mean(dE**2))),
+    }
+
+
+def compare_refinement(h=4e-4, refine=4, refine_width=None, margin=None):
+    """
+    Compare the graded grid with uniform grids of its coarsest and finest spacing.
+
+    Args:
+        h (float): Coarse spacing.
+        refine (int): Refinement factor around the wall.
+        refine_width (float): Width of the finest band, see ``Grid``.
+        margin (float): Distance from the wall block over which the errors
+            are measured, by default the width of the finest band.
+
+    Returns:
+        dict: For the "coarse", "graded" and "fine" grids the number of
+            unknowns, the solve time (s) and the errors of ``field_errors``
+            against the uniform grid of spacing h / (2 * refine).
+    """
+    grids = {
+        "coarse": make_grid(h),
+        "graded": make_grid(h, refine=refine, refine_width=refine_width),
+        "fine": make_grid(h / refine),
+    }
+    if margin is None:
+        margin = grids["graded"].refine_width
+    reference, _ = solve(make_grid(h / (2 * refine)))
+    report = {}
+    for name, grid in grids.items():
+        field, elapsed = solve(grid)
+        report[name] = dict(
+            unknowns=grid.Nx * grid.Ny,
+            time=elapsed,
+            **field_errors(field, reference, margin),
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m pic.refinement")
+    parser.add_argument("--h", type=float, default=4e-4, help="coarse spacing")
+    parser.add_argument("--refine", type=int, default=4)
+    parser.add_argument("--refine-width", type=float, default=None)
+    args = parser.parse_args()
+
+    report = compare_refinement(args.h, args.refine, args.refine_width)
+    print(
+        f"{'':8}{'unknowns':>10}{'time (s)':>10}{'max dV':>10}{'rms dV':>10}"
+        f"{'max dE':>10}{'rms dE':>10}"
+    )
+    for name, r in report.items():
+        print(
+            f"{name:8}{r['unknowns']:>10}{r['time']:>10.3f}{r['max_V']:>10.3f}"
+            f"{r['rms_V']:>10.3f}{r['max_E']:>10.3g}{r['rms_E']:>10.3g}"
+        )
@@ -0,0 +1,533 @@
+"""Streaming ensemble statistics of particles leaving the domain.
+
+Run as ``python -m pic.statistics`` to launch many particles from an inlet
+distribution in batches and accumulate, at every outlet crossing and wall
+hit, running moments and fixed-bin histograms of the exit energy, angle
+and height, the transmission and a map of the wall impacts. Memory is set
+by the batch size and the number of bins, not by the number of particles
+or steps, and the statistics of batches run by different processes merge
+into the same result as a serial run.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .defaults import H, make_grid
+from .field import ElectricField
+from .integrator import PUSHERS, RZ_PUSHERS
+from .particle import Particles, Q, M
+
+
+class RunningMoments:
+    """Count, mean, variance, minimum and maximum of a stream of values."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        """Add a batch of values."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        batch = RunningMoments()
+        batch.n = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(np.sum((values - batch.mean) ** 2))
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other):
+        """
+        Combine with the moments of another stream (Chan et al.).
+
+        Adding values one by one is Welford's update; adding a batch or
+        another stream combines the two means and sums of squared deviations
+        directly, which is as accurate and independent of the split.
+        """
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta**2 * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Sample variance, nan below two values."""
+        return self.m2 / (self.n - 1) if self.n > 1 else np.nan
+
+    @property
+    def std(self):
+        """Sample standard deviation."""
+        return np.sqrt(self.variance)
+
+    def to_dict(self):
+        """Return the moments as a JSON-serializable dict."""
+        empty = self.n == 0
+        return {
+            "n": self.n,
+            "mean": None if empty else self.mean,
+            "std": None if self.n < 2 else float(self.std),
+            "min": None if empty else self.min,
+            "max": None if empty else self.max,
+        }
+
+
+class Histogram:
+    """Histogram with fixed, equal bins and counts of values out of range."""
+
+    def __init__(self, lo, hi, bins):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            lo (float): Lower edge of the first bin.
+            hi (float): Upper edge of the last bin.
+            bins (int): Number of bins.
+        """
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    @property
+    def edges(self):
+        """Bin edges."""
+        return np.linspace(self.lo, self.hi, len(self.counts) + 1)
+
+    def add(self, values):
+        """Add a batch of values."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        bins = len(self.counts)
+        k = np.floor((values - self.lo) * (bins / (self.hi - self.lo)))
+        self.underflow += int(np.count_nonzero(k < 0))
+        # the upper edge belongs to the last bin
+        k[values == self.hi] = bins - 1
+        self.overflow += int(np.count_nonzero(k >= bins))
+        inside = (k >= 0) & (k < bins)
+        self.counts += np.bincount(k[inside].astype(np.intp), minlength=bins)
+
+    def merge(self, other):
+        """Add the counts of a histogram with the same bins."""
+        if (self.lo, self.hi, len(self.counts)) != (other.lo, other.hi, len(other.counts)):
+            raise ValueError("Cannot merge histograms with different bins.")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    def quantile(self, q):
+        """
+        Return the q-quantile of the values in range, interpolated within its bin.
+
+        Args:
+            q (float or numpy.ndarray): Quantile(s) between 0 and 1.
+        """
+        total = self.counts.sum()
+        if total == 0:
+            return np.full(np.shape(q), np.nan)[()]
+        cdf = np.concatenate(([0], np.cumsum(self.counts))) / total
+        return np.interp(q, cdf, self.edges)
+
+    def to_dict(self):
+        """Return the histogram as a JSON-serializable dict."""
+        return {
+            "edges": self.edges.tolist(),
+            "counts": self.counts.tolist(),
+            "underflow": self.underflow,
+            "overflow": self.overflow,
+        }
+
+
+class Histogram2D:
+    """Two dimensional histogram with fixed, equal bins; values out of range are dropped."""
+
+    def __init__(self, x_range, y_range, bins):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            x_range (tuple): Lower and upper edge along x.
+            y_range (tuple): Lower and upper edge along y.
+            bins (tuple): Number of bins along x and y.
+        """
+        self.x_range = tuple(map(float, x_range))
+        self.y_range = tuple(map(float, y_range))
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def add(self, x, y):
+        """Add a batch of points."""
+        counts, _, _ = np.histogram2d(
+            x, y, bins=self.counts.shape, range=(self.x_range, self.y_range)
+        )
+        self.counts += counts.astype(np.int64)
+
+    def merge(self, other):
+        """Add the counts of a histogram with the same bins."""
+        if (self.x_range, self.y_range, self.counts.shape) != (
+            other.x_range,
+            other.y_range,
+            other.counts.shape,
+        ):
+            raise ValueError("Cannot merge histograms with different bins.")
+        self.counts += other.counts
+
+    def to_dict(self):
+        """Return the histogram as a JSON-serializable dict."""
+        return {
+            "x_range": list(self.x_range),
+            "y_range": list(self.y_range),
+            "counts": self.counts.tolist(),
+        }
+
+
+class EnsembleStatistics:
+    """Outlet and wall statistics accumulated from the events of each push."""
+
+    # exit quantities: name, unit
+    QUANTITIES = (("exit_energy", "eV"), ("exit_angle", "deg"), ("exit_height", "m"))
+    COUNTS = (
+        "n_particles",
+        "n_outlet",
+        "n_inlet",
+        "n_wall_hits",
+        "n_wall_absorbed",
+        "n_remaining",
+    )
+
+    def __init__(self, grid, energy_range=(0.0, 2000.0), bins=200, wall_bins=(100, 50)):
+        """
+        Initialize empty statistics.
+
+        Args:
+            grid (Grid): Grid of the runs, setting the ranges of the exit
+                height and of the wall impact map.
+            energy_range (tuple): Range of the exit energy histogram (eV).
+            bins (int): Number of bins of the exit histograms.
+            wall_bins (tuple): Number of bins of the wall impact map along x
+                and y, which covers the wall block and one tenth of its size
+                around it.
+        """
+        self.n_particles = 0
+        self.n_outlet = 0
+        self.n_inlet = 0
+        self.n_wall_hits = 0
+        self.n_wall_absorbed = 0
+        self.n_remaining = 0
+        self.moments = {name: RunningMoments() for name, _ in self.QUANTITIES}
+        self.histograms = {
+            "exit_energy": Histogram(*energy_range, bins),
+            "exit_angle": Histogram(-90.0, 90.0, bins),
+            "exit_height": Histogram(0.0, grid.height, bins),
+        }
+        pad_x = grid.w_wall / 10
+        pad_y = grid.h_wall / 10
+        self.wall_impacts = Histogram2D(
+            (grid.x_wall - pad_x, grid.x_wall + grid.w_wall + pad_x),
+            (0.0, grid.h_wall + pad_y),
+            wall_bins,
+        )
+
+    def record(self, particles):
+        """
+        Add the outlet crossings, inlet losses and wall hits of the last push.
+
+        Exit energies are kinetic (eV) with every velocity component, the
+        angle is that of the velocity to the x axis and the wall impacts are
+        the points where the particles first hit the wall in the step.
+        """
+        _, x, v = particles.last_events["outlet"]
+        if len(x):
+            v = v.astype(np.float64)
+            values = {
+                "exit_energy": 0.5 * M * np.einsum("ij,ij->i", v, v) / Q,
+                "exit_angle": np.degrees(np.arctan2(v[:, 1], v[:, 0])),
+                "exit_height": x[:, 1],
+            }
+            for name, value in values.items():
+                self.moments[name].add(value)
+                self.histograms[name].add(value)
+            self.n_outlet += len(x)
+        _, x, _ = particles.last_events["wall"]
+        if len(x):
+            self.wall_impacts.add(x[:, 0], x[:, 1])
+            self.n_wall_hits += len(x)
+        self.n_wall_absorbed += particles.last_absorbed["wall"]
+        self.n_inlet += particles.last_absorbed["inlet"]
+
+    def merge(self, other):
+        """Add the statistics of another ensemble with the same bins."""
+        for name in self.COUNTS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in self.moments:
+            self.moments[name].merge(other.moments[name])
+            self.histograms[name].merge(other.histograms[name])
+        self.wall_impacts.merge(other.wall_impacts)
+
+    @property
+    def transmission(self):
+        """Fraction of the launched particles that reached the outlet."""
+        return self.n_outlet / self.n_particles if self.n_particles else np.nan
+
+    def to_dict(self):
+        """Return the statistics as a JSON-serializable dict."""
+        return {
+            **{name: getattr(self, name) for name in self.COUNTS},
+            "transmission": self.transmission,
+            "moments": {name: m.to_dict() for name, m in self.moments.items()},
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            "wall_impacts": self.wall_impacts.to_dict(),
+        }
+
+    def summary(self):
+        """Return a table of the counts and of the exit quantities."""
+        lines = [
+            f"particles {self.n_particles}, outlet {self.n_outlet} "
+            f"(transmission {self.transmission:.4f}), back through the inlet "
+            f"{self.n_inlet}, wall hits {self.n_wall_hits}, "
+            f"still inside {self.n_remaining}",
+            f"{'':14}{'mean':>12}{'std':>12}{'p05':>12}{'p50':>12}{'p95':>12}",
+        ]
+        for name, unit in self.QUANTITIES:
+            m = self.moments[name]
+            p05, p50, p95 = self.histograms[name].quantile([0.05, 0.5, 0.95])
+            lines.append(
+                f"{name + ' (' + unit + ')':<14}{m.mean:>12.4g}{m.std:>12.4g}"
+                f"{p05:>12.4g}{p50:>12.4g}{p95:>12.4g}"
+            )
+        return "\n".join(lines)
+
+
+class InletDistribution:
+    """Distribution of the particles launched from the inlet."""
+
+    def __init__(self, energy=1.0, energy_spread=0.0, angle_spread=0.0, y_range=None):
+        """
+        Initialize the distribution.
+
+        Args:
+            energy (float): Mean kinetic energy (eV).
+            energy_spread (float): Standard deviation of the energy (eV),
+                normal and truncated at zero.
+            angle_spread (float): Standard deviation of the angle to the x
+                axis (degrees), normal and truncated at +-90.
+            y_range (tuple): Range of launch heights, by default the whole
+                inlet. Heights are uniform, or uniform over the inlet disk
+                (radius distributed as r) on an axisymmetric grid.
+        """
+        self.energy = energy
+        self.energy_spread = energy_spread
+        self.angle_spread = angle_spread
+        self.y_range = y_range
+
+    def sample(self, n, grid, rng):
+        """
+        Draw n particles.
+
+        Returns:
+            tuple: (n, 2) positions on the inlet and (n, 2) velocities.
+        """
+        y0, y1 = self.y_range or (0.0, grid.height)
+        positions = np.zeros((n, 2))
+        if grid.axisymmetric:
+            positions[:, 1] = np.sqrt(rng.uniform(y0**2, y1**2, n))
+        else:
+            positions[:, 1] = rng.uniform(y0, y1, n)
+        energy = np.maximum(rng.normal(self.energy, self.energy_spread, n), 0.0)
+        angle = np.radians(np.clip(rng.normal(0.0, self.angle_spread, n), -90, 90))
+        speed = np.sqrt(2 * Q * energy / M)
+        velocities = np.column_stack((speed * np.cos(angle), speed * np.sin(angle)))
+        return positions, velocities
+
+
+def run_batch(
+    fields,
+    n,
+    distribution,
+    seed,
+    statistics,
+    method="boris",
+    dt=None,
+    max_steps=20000,
+    absorb_wall=False,
+):
+    """
+    Launch a batch of particles and run them until they all left the domain.
+
+    Args:
+        fields (ElectricField): Solved field of the run.
+        n (int): Number of particles.
+        distribution (InletDistribution): Launch distribution.
+        seed (numpy.random.SeedSequence or int): Seed of the batch.
+        statistics (EnsembleStatistics): Statistics updated in place.
+        method (str): Pusher name.
+        dt (float): Time step, by default that of ``python -m pic``.
+        max_steps (int): Steps after which the particles still in the domain
+            are counted in ``n_remaining`` and dropped.
+        absorb_wall (bool): Remove particles hitting the biased wall.
+    """
+    grid = fields.grid
+    if dt is None:
+        dt = grid.h / np.sqrt(2 * Q * (grid.Vin - grid.Vout) / M)
+    pusher = (RZ_PUSHERS if grid.axisymmetric else PUSHERS)[method]
+    rng = np.random.default_rng(seed)
+    positions, velocities = distribution.sample(n, grid, rng)
+
+    particles = Particles(
+        0,
+        grid.height,
+        absorb_wall=absorb_wall,
+        capacity=n,
+        dtype=fields.dtype,
+        axisymmetric=grid.axisymmetric,
+    )
+    particles.inject(positions, velocities)
+    statistics.n_particles += n
+    steps = 0
+    while particles.num and steps < max_steps:
+        # every batch sees the electrode waveforms from t = 0
+        fields.update(particles.time)
+        particles.push(pusher, fields, dt, grid)
+        statistics.record(particles)
+        steps += 1
+    statistics.n_remaining += int(particles.num)
+
+
+_fields = None
+
+
+def _init_worker(fields):
+    """Keep the solved field in each worker process."""
+    global _fields
+    _fields = fields
+
+
+def _run_in_worker(args):
+    n, seed, distribution, statistics, options = args
+    run_batch(_fields, n, distribution, seed, statistics, **options)
+    return statistics
+
+
+def run_ensemble(
+    fields,
+    n_particles,
+    distribution=None,
+    batch_size=10000,
+    workers=1,
+    seed=0,
+    energy_range=None,
+    bins=200,
+    **options,
+):
+    """
+    Run an ensemble in batches and return its merged statistics.
+
+    Every batch gets its own random stream spawned from ``seed``, so the
+    result does not depend on the number of workers.
+
+    Args:
+        fields (ElectricField): Solved field of the run.
+        n_particles (int): Total number of particles.
+        distribution (InletDistribution): Launch distribution, by default
+            1 eV along x over the whole inlet.
+        batch_size (int): Particles run together, which sets the memory.
+        workers (int): Number of processes, 1 runs the batches here.
+        seed (int): Seed of the ensemble.
+        energy_range (tuple): Range of the exit energy histogram (eV), by
+            default up to 1.5 times the electrode voltage span.
+        bins (int): Number of bins of the exit histograms.
+        **options: ``method``, ``dt``, ``max_steps`` and ``absorb_wall`` of
+            ``run_batch``.
+
+    Returns:
+        EnsembleStatistics: The statistics of all batches.
+    """
+    grid = fields.grid
+    distribution = distribution or InletDistribution()
+    if energy_range is None:
+        span = np.ptp([grid.Vin, grid.Vout, grid.Vwall])
+        energy_range = (0.0, 1.5 * span + distribution.energy + 5 * distribution.energy_spread)
+    sizes = [batch_size] * (n_particles // batch_size)
+    if n_particles % batch_size:
+        sizes.append(n_particles % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    def empty():
+        return EnsembleStatistics(grid, energy_range, bins)
+
+    # batches are merged in order either way, so the sums match exactly
+    statistics = empty()
+    if workers == 1:
+        for n, s in zip(sizes, seeds):
+            batch = empty()
+            run_batch(fields, n, distribution, s, batch, **options)
+            statistics.merge(batch)
+        return statistics
+    tasks = [(n, s, distribution, empty(), options) for n, s in zip(sizes, seeds)]
+    # spawn, as forking after numba started its threads can deadlock
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(fields,),
+    ) as pool:
+        for batch in pool.map(_run_in_worker, tasks):
+            statistics.merge(batch)
+    return statistics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m pic.statistics")
+    parser.add_argument("method", nargs="?", default="boris", choices=sorted(PUSHERS))
+    parser.add_argument("--particles", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--energy", type=float, default=1.0, help="mean launch energy (eV)")
+    parser.add_argument("--energy-spread", type=float, default=0.0, help="(eV)")
+    parser.add_argument("--angle-spread", type=float, default=0.0, help="(degrees)")
+    parser.add_argument("--bins", type=int, default=200)
+    parser.add_argument("--max-steps", type=int, default=20000)
+    parser.add_argument("--absorb-wall", action="store_true")
+    parser.add_argument("--axisymmetric", action="store_true")
+    parser.add_argument("--h", type=float, default=H)
+    parser.add_argument("--cache-dir", help="directory caching the solved fields")
+    parser.add_argument("-o", "--output", help="write the statistics as JSON")
+    args = parser.parse_args()
+    if args.axisymmetric and args.method not in RZ_PUSHERS:
+        parser.error("axisymmetric runs use the boris pusher")
+
+    grid = make_grid(args.h, axisymmetric=args.axisymmetric)
+    fields = ElectricField(grid, cache=args.cache_dir)
+    distribution = InletDistribution(args.energy, args.energy_spread, args.angle_spread)
+    t0 = time.perf_counter()
+    statistics = run_ensemble(
+        fields,
+        args.particles,
+        distribution,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        seed=args.seed,
+        bins=args.bins,
+        method=args.method,
+        max_steps=args.max_steps,
+        absorb_wall=args.absorb_wall,
+    )
+    print(statistics.summary())
+    print(f"{args.particles} particles in {time.perf_counter() - t0:.1f} seconds")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(statistics.to_dict(), f)
@@ -0,0 +1,209 @@
+"""Parameter sweeps reusing the grid and field solve across cases.
+
+Run as ``python -m pic.sweep cases.csv -o results.csv`` where each row of
+``cases.csv`` sets some of the parameters in ``DEFAULTS``, or build the
+table from ``--param name=value1,value2`` products.
+"""
+
+import argparse
+import csv
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import defaults
+from .field import SOLVERS, ElectricField
+from .grid import Grid
+from .integrator import PUSHERS
+from .particle import Particles, Q, M
+
+# Parameters of a case and their values when a table does not set them.
+# dt=None uses the step of ``python -m pic``, h / sqrt(2 Q (Vin - Vout) / M).
+DEFAULTS = {
+    "h": defaults.H,
+    "refine": 1,
+    **defaults.GEOMETRY,
+    **defaults.VOLTAGES,
+    "v0": 100,
+    "dt": None,
+    "method": "euler",
+    "Bz": 0.0,
+    "n_particles": 10,
+    "n_steps": 2000,
+}
+
+# Parameters that define the grid and therefore the field solve
+GEOMETRY = ("h", "length", "height", "h_wall", "w_wall", "x_wall", "refine")
+
+_fields = None
+
+
+def _init_worker(fields):
+    """Keep the solved field of a geometry in each worker process."""
+    global _fields
+    _fields = fields
+
+
+def run_case(fields, case):
+    """
+    Run one case on an already solved field.
+
+    Args:
+        fields (ElectricField): Field solved for the case's geometry.
+        case (dict): Full set of parameters, see ``DEFAULTS``.
+
+    Returns:
+        dict: The case parameters with the transmission fraction, the
+            fraction returning through the inlet (``reflection``), the mean
+            and spread of the kinetic energy at the outlet (J), the number of
+            wall hits, the number of steps taken and the wall-clock time.
+    """
+    t0 = time.perf_counter()
+    grid = fields.grid
+    fields.set_voltages(case["Vin"], case["Vout"], case["Vwall"])
+    dt = case["dt"]
+    if dt is None:
+        dt = case["h"] / np.sqrt(2 * Q * (case["Vin"] - case["Vout"]) / M)
+    B = np.array([0.0, 0.0, case["Bz"]]) if case["Bz"] else None
+
+    particles = Particles(case["n_particles"], grid.height, case["v0"])
+    exit_energies = []
+    steps = 0
+    while steps < case["n_steps"] and particles.num:
+        particles.push(PUSHERS[case["method"]], fields, dt, grid, B)
+        steps += 1
+        _, _, v = particles.last_events["outlet"]
+        exit_energies.append(0.5 * M * np.einsum("ij,ij->i", v, v))
+
+    exit_energies = np.concatenate(exit_energies) if exit_energies else np.zeros(0)
+    result = dict(case)
+    result.update(
+        dt=dt,
+        transmission=particles.n_absorbed["outlet"] / case["n_particles"],
+        reflection=particles.n_absorbed["inlet"] / case["n_particles"],
+        exit_energy_mean=exit_energies.mean() if len(exit_energies) else np.nan,
+        exit_energy_spread=exit_energies.std() if len(exit_energies) else np.nan,
+        wall_hits=particles.n_wall_hits,
+        steps=steps,
+        wall_time=time.perf_counter() - t0,
+    )
+    return result
+
+
+def _run_in_worker(case):
+    return run_case(_fields, case)
+
+
+def run_sweep(cases, workers=1, solver="spsolve", cache=None):
+    """
+    Run a table of cases.
+
+    Cases are grouped by geometry so that each grid is assembled and solved
+    once; the voltages of each case are then applied by superposition. The
+    cases of a group are spread over ``workers`` processes, which receive
+    the solved field once when they start.
+
+    Args:
+        cases (list): Dicts of parameters, missing ones take ``DEFAULTS``.
+        workers (int): Number of processes, 1 runs the cases in this process.
+        solver (str): Poisson solver, see ``ElectricField``.
+        cache (FieldCache or str): Optional cache of the solved fields, see
+            ``ElectricField``.
+
+    Returns:
+        list: Result dicts of ``run_case``, in the order of ``cases``.
+    """
+    cases = [dict(DEFAULTS, **case) for case in cases]
+    for case in cases:
+        if case["method"] not in PUSHERS:
+            raise ValueError(f"Unknown method {case['method']!r}.")
+
+    groups = {}
+    for i, case in enumerate(cases):
+        groups.setdefault(tuple(case[k] for k in GEOMETRY), []).append(i)
+
+    results = [None] * len(cases)
+    for geometry, idx in groups.items():
+        first = cases[idx[0]]
+        *shape, refine = geometry
+        grid = Grid(*shape, first["Vin"], first["Vout"], first["Vwall"], refine=refine)
+        fields = ElectricField(grid, solver=solver, cache=cache)
+        if workers == 1:
+            group_results = [run_case(fields, cases[i]) for i in idx]
+        else:
+            with ProcessPoolExecutor(
+                workers, initializer=_init_worker, initargs=(fields,)
+            ) as pool:
+                group_results = list(pool.map(_run_in_worker, [cases[i] for i in idx]))
+        for i, result in zip(idx, group_results):
+            results[i] = result
+    return results
+
+
+def product_table(**values):
+    """Return the cases of every combination of the given parameter values."""
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*values.values())]
+
+
+def _parse(value):
+    """Convert a table entry to int, float or None where possible."""
+    if value in ("", "None"):
+        return None
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def read_table(path):
+    """Read cases from a CSV file with one parameter per column."""
+    with open(path, newline="") as f:
+        return [{k: _parse(v) for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def write_table(path, results):
+    """Write result dicts to a CSV file."""
+    names = list(dict.fromkeys(k for result in results for k in result))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, names)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m pic.sweep")
+    parser.add_argument("table", nargs="?", help="CSV file of cases")
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="NAME=V1,V2",
+        help="sweep a parameter over values (combined with the table rows)",
+    )
+    parser.add_argument("-o", "--output", default="sweep_results.csv")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--solver", default="spsolve", choices=SOLVERS)
+    parser.add_argument("--cache-dir", help="directory caching the solved fields")
+    args = parser.parse_args()
+
+    cases = read_table(args.table) if args.table else [{}]
+    if args.param:
+        values = {}
+        for item in args.param:
+            name, _, vals = item.partition("=")
+            if name not in DEFAULTS:
+                parser.error(f"unknown parameter {name!r}")
+            values[name] = [_parse(v) for v in vals.split(",")]
+        cases = [dict(c, **p) for c in cases for p in product_table(**values)]
+
+    t0 = time.perf_counter()
+    results = run_sweep(
+        cases, workers=args.workers, solver=args.solver, cache=args.cache_dir
+    )
+    write_table(args.output, results)
+    print(f"{len(results)} cases in {time.perf_counter() - t0:.1f} seconds, written to {args.output}")
@@ -0,0 +1,240 @@
+"""Per-phase timers, counters and profiling hooks for the simulation loop.
+
+The stages of the code report to the module-level ``TIMERS``, which does
+nothing until it is enabled::
+
+    from pic.timing import TIMERS
+
+    TIMERS.enable(trace=True)
+    for step in range(n_steps):
+        TIMERS.begin_step(step)
+        ...
+        TIMERS.end_step()
+    print(TIMERS.summary())
+    TIMERS.save_trace("trace.json")
+
+Phases nest: the time of a phase run inside another (the gather inside a
+push) is its own, and excluded from the "self" time of the outer phase.
+"""
+
+import cProfile
+import contextlib
+import functools
+import io
+import json
+import pstats
+import time
+
+_NULL = contextlib.nullcontext()
+
+
+class _Phase:
+    """Context manager timing one run of a phase."""
+
+    __slots__ = ("timers", "name", "start", "children")
+
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0.0
+        self.timers._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        timers = self.timers
+        timers._stack.pop()
+        elapsed = end - self.start
+        own = elapsed - self.children
+        if timers._stack:
+            timers._stack[-1].children += elapsed
+
+        name = self.name
+        timers.calls[name] = timers.calls.get(name, 0) + 1
+        timers.total[name] = timers.total.get(name, 0.0) + elapsed
+        timers.own[name] = timers.own.get(name, 0.0) + own
+        if timers._current is not None:
+            timers._current[name] = timers._current.get(name, 0.0) + own
+        if timers.trace:
+            timers.events.append((name, self.start, elapsed))
+        return False
+
+
+class Timers:
+    """Named phase timers and counters accumulated over a run."""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self._profiler = None
+        self.profile_steps = ()
+        self.reset()
+
+    def reset(self):
+        """Clear all timings, counters and trace events."""
+        self.calls = {}
+        self.total = {}
+        self.own = {}
+        self.counters = {}
+        self.steps = []
+        self.events = []
+        self._stack = []
+        self._current = None
+        self._step = None
+        self._start = time.perf_counter()
+        self._stop = None
+
+    def enable(self, trace=False, profile_steps=None):
+        """
+        Start timing.
+
+        Args:
+            trace (bool): Keep every phase run for ``save_trace``.
+            profile_steps (iterable): Step numbers to run under cProfile, see
+                ``save_profile``.
+        """
+        self.reset()
+        self.enabled = True
+        self.trace = trace
+        self.profile_steps = frozenset(profile_steps or ())
+        self._profiler = cProfile.Profile() if self.profile_steps else None
+
+    def disable(self):
+        """Stop timing, keeping what was accumulated."""
+        self.enabled = False
+        self._stop = time.perf_counter()
+
+    def phase(self, name):
+        """Return a context manager timing a phase, a no-op when disabled."""
+        if not self.enabled:
+            return _NULL
+        return _Phase(self, name)
+
+    def count(self, name, n=1):
+        """Add n to a named counter."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def begin_step(self, step):
+        """Mark the start of a step, profiling it if it was selected."""
+        if not self.enabled:
+            return
+        self._step = step
+        self._current = {}
+        self._step_start = time.perf_counter()
+        if step in self.profile_steps:
+            self._profiler.enable()
+
+    def end_step(self):
+        """Mark the end of the step started by ``begin_step``."""
+        if self._current is None:
+            return
+        if self._step in self.profile_steps:
+            self._profiler.disable()
+        self._current["step"] = time.perf_counter() - self._step_start
+        self.steps.append(self._current)
+        self._current = None
+
+    def wall_time(self):
+        """Return the time since timing was enabled (until it was disabled)."""
+        return (self._stop or time.perf_counter()) - self._start
+
+    def summary(self):
+        """Return a table of the phases, slowest first, and the counters."""
+        wall = self.wall_time()
+        n_steps = max(len(self.steps), 1)
+        lines = [
+            f"{'phase':<16}{'calls':>9}{'total (s)':>12}{'self (s)':>12}"
+            f"{'self %':>8}{'ms/step':>10}"
+        ]
+        for name in sorted(self.own, key=self.own.get, reverse=True):
+            per_step = sum(s.get(name, 0.0) for s in self.steps) / n_steps
+            lines.append(
+                f"{name:<16}{self.calls[name]:>9}{self.total[name]:>12.4f}"
+                f"{self.own[name]:>12.4f}{100 * self.own[name] / wall:>8.1f}"
+                f"{1e3 * per_step:>10.3f}"
+            )
+        lines.append(f"{'wall':<16}{len(self.steps):>9}{wall:>12.4f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name:<16}{n:>9}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        """Return the timings as a JSON-serializable dict."""
+        return {
+            "wall": self.wall_time(),
+            "phases": {
+                name: {
+                    "calls": self.calls[name],
+                    "total": self.total[name],
+                    "self": self.own[name],
+                }
+                for name in self.own
+            },
+            "counters": dict(self.counters),
+            "steps": self.steps,
+        }
+
+    def save_json(self, path):
+        """Write ``to_dict`` to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def save_trace(self, path):
+        """
+        Write the phase runs kept with ``trace=True`` in the Chrome trace
+        event format, viewable in chrome://tracing or https://ui.perfetto.dev.
+        """
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": 1e6 * (start - self._start),
+                "dur": 1e6 * elapsed,
+                "pid": 0,
+                "tid": 0,
+            }
+            for name, start, elapsed in self.events
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def save_profile(self, path, n_lines=20):
+        """
+        Save the cProfile statistics of the profiled steps.
+
+        Args:
+            path (str): Output file, readable with ``pstats`` or snakeviz.
+            n_lines (int): Number of functions of the returned report.
+
+        Returns:
+            str: The functions with the highest cumulative time.
+        """
+        if self._profiler is None:
+            raise RuntimeError("No steps were profiled, see Timers.enable.")
+        self._profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(n_lines)
+        return out.getvalue()
+
+
+TIMERS = Timers()
+
+
+def timed(name):
+    """Decorator timing every call of a function as the phase ``name``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TIMERS.enabled:
+                return func(*args, **kwargs)
+            with _Phase(TIMERS, name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
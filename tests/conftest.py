@@ -0,0 +1,19 @@
+"""Grids shared by the tests."""
+
+import pytest
+
+from pic.defaults import GEOMETRY, VOLTAGES
+from pic.grid import Grid
+
+# The case of ``python -m pic`` at a coarse spacing
+H = 4e-4
+
+
+def make_grid(h=H, **overrides):
+    """Return the grid of ``python -m pic`` with spacing h and some parameters changed."""
+    return Grid(h, **{**GEOMETRY, **VOLTAGES, **overrides})
+
+
+@pytest.fixture(scope="session")
+def grid():
+    return make_grid()
@@ -0,0 +1,119 @@
+"""Collision of particle paths with the domain edges and the biased wall."""
+
+import numpy as np
+import pytest
+
+from pic.boundary import collide
+
+
+def run(grid, start, end, velocity):
+    """Collide single segments, returning the new ends, velocities and masks."""
+    start = np.array(start, dtype=float).reshape(-1, 2)
+    end = np.array(end, dtype=float).reshape(-1, 2)
+    velocity = np.array(velocity, dtype=float).reshape(-1, 2)
+    masks = collide(start, end, velocity, grid)
+    return end, velocity, masks
+
+
+def inside_wall(grid, pos):
+    """Return which positions lie strictly inside the biased wall block."""
+    x, y = pos[:, 0], pos[:, 1]
+    return (x > grid.x_wall) & (x < grid.x_wall + grid.w_wall) & (y < grid.h_wall)
+
+
+def test_wall_faces(grid):
+    end, v, (outlet, wall, inlet) = run(
+        grid,
+        [[0.009, 0.002], [0.015, 0.005], [0.021, 0.001]],
+        [[0.011, 0.002], [0.015, 0.003], [0.019, 0.001]],
+        [[1.0, 0.0], [0.0, -1.0], [-1.0, 0.0]],
+    )
+    np.testing.assert_allclose(end, [[0.009, 0.002], [0.015, 0.005], [0.021, 0.001]])
+    np.testing.assert_array_equal(v, [[-1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+    assert wall.all() and not (outlet.any() or inlet.any())
+
+
+def test_corner_cut(grid):
+    """A step ending beyond the wall but crossing its left face reflects there."""
+    end, v, (outlet, wall, inlet) = run(grid, [0.0095, 0.003], [0.0205, 0.0045], [1.0, 0.15])
+    assert wall[0]
+    assert end[0, 0] < grid.x_wall
+    np.testing.assert_allclose(v, [[-1.0, 0.15]])
+
+
+def test_corner_hit(grid):
+    """A step through the top left corner reflects off one face only."""
+    start = np.array([grid.x_wall - 1e-3, grid.h_wall + 1e-3])
+    end, v, (outlet, wall, inlet) = run(grid, start, start + [2e-3, -2e-3], [1.0, -1.0])
+    assert wall[0]
+    assert not inside_wall(grid, end).any()
+    assert np.count_nonzero(v[0] != [1.0, -1.0]) == 1
+
+
+def test_bottom_beside_wall(grid):
+    """The bottom edge reflects on either side of the wall but not under it."""
+    end, v, (outlet, wall, inlet) = run(
+        grid,
+        [[0.005, 0.001], [0.03, 0.001]],
+        [[0.006, -0.001], [0.031, -0.001]],
+        [[1.0, -2.0], [1.0, -2.0]],
+    )
+    np.testing.assert_allclose(end, [[0.006, 0.001], [0.031, 0.001]])
+    np.testing.assert_array_equal(v, [[1.0, 2.0], [1.0, 2.0]])
+    assert not wall.any()
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        # along the top of the wall and along the top of the domain
+        ([0.012, 0.004], [0.018, 0.004]),
+        ([0.03, 0.02], [0.04, 0.02]),
+        # over the top left corner, just missing the left face
+        ([0.0095, 0.0039], [0.0105, 0.0049]),
+    ],
+)
+def test_grazing_miss(grid, start, end):
+    new_end, v, (outlet, wall, inlet) = run(grid, start, end, [1.0, 0.0])
+    np.testing.assert_array_equal(new_end, [end])
+    np.testing.assert_array_equal(v, [[1.0, 0.0]])
+    assert not (outlet.any() or wall.any() or inlet.any())
+
+
+def test_grazing_hit(grid):
+    """A shallow step dipping into the wall top reflects off it."""
+    end, v, (outlet, wall, inlet) = run(grid, [0.012, 0.0041], [0.018, 0.0039], [6.0, -0.2])
+    assert wall[0]
+    np.testing.assert_allclose(end, [[0.018, 0.0041]])
+    np.testing.assert_allclose(v, [[6.0, 0.2]])
+
+
+def test_outlet(grid):
+    end, v, (outlet, wall, inlet) = run(grid, [0.049, 0.01], [0.051, 0.012], [1.0, 1.0])
+    assert outlet[0] and not (wall[0] or inlet[0])
+    np.testing.assert_allclose(end, [[grid.length, 0.011]])
+    np.testing.assert_array_equal(v, [[1.0, 1.0]])
+
+
+def test_inlet(grid):
+    """A particle turning back stops on the inlet."""
+    end, v, (outlet, wall, inlet) = run(grid, [0.001, 0.01], [-0.001, 0.011], [-1.0, 0.5])
+    assert inlet[0] and not (outlet[0] or wall[0])
+    np.testing.assert_allclose(end, [[0.0, 0.0105]])
+    np.testing.assert_array_equal(v, [[-1.0, 0.5]])
+
+
+def test_long_steps(grid):
+    """Steps many cells long never end inside the wall or outside the domain."""
+    rng = np.random.default_rng(0)
+    start = rng.uniform((0, 0), (grid.length, grid.height), (20000, 2))
+    start = start[~inside_wall(grid, start)]
+    step = rng.normal(0, 0.01, start.shape)
+    end = start + step
+    v = step.copy()
+    _, wall, _ = collide(start, end, v, grid)
+    assert wall.any()
+    assert not inside_wall(grid, end).any()
+    x, y = end.T
+    assert np.all((x >= 0) & (x <= grid.length) & (y >= 0) & (y <= grid.height))
+    np.testing.assert_allclose(np.hypot(*v.T), np.hypot(*step.T))
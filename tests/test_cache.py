@@ -0,0 +1,84 @@
+"""The on-disk field cache: keys, round trips and eviction."""
+
+import os
+
+import numpy as np
+
+from pic.cache import FieldCache
+from pic.field import ElectricField
+
+from conftest import make_grid
+
+
+def entry(seed):
+    """Return the arrays of a cache entry."""
+    rng = np.random.default_rng(seed)
+    return {"a": rng.normal(size=1000), "b": np.arange(6, dtype=np.int32).reshape(2, 3)}
+
+
+def test_key():
+    assert FieldCache.key(h=1e-4, solver="mgcg") == FieldCache.key(solver="mgcg", h=1e-4)
+    assert FieldCache.key(h=1e-4) != FieldCache.key(h=2e-4)
+
+
+def test_round_trip(tmp_path):
+    cache = FieldCache(str(tmp_path))
+    assert cache.load("missing") is None
+    arrays = entry(0)
+    cache.store("k", arrays)
+    loaded = cache.load("k")
+    assert sorted(loaded) == ["a", "b"]
+    for name, arr in arrays.items():
+        np.testing.assert_array_equal(loaded[name], arr)
+        assert loaded[name].dtype == arr.dtype
+        assert isinstance(loaded[name], np.memmap)
+        assert not loaded[name].flags.writeable
+
+
+def test_store_twice(tmp_path):
+    """A second store of an existing entry keeps the first copy."""
+    cache = FieldCache(str(tmp_path))
+    cache.store("k", entry(0))
+    cache.store("k", entry(1))
+    np.testing.assert_array_equal(cache.load("k")["a"], entry(0)["a"])
+    assert [key for _, _, key in cache.entries()] == ["k"]
+
+
+def test_lru_eviction(tmp_path):
+    cache = FieldCache(str(tmp_path))
+    cache.store("first", entry(0))
+    size = cache.entries()[0][1]
+    cache.max_bytes = int(2.5 * size)
+    cache.store("second", entry(1))
+    # make the order of use explicit, then use the first entry again
+    os.utime(tmp_path / "first", (1, 1))
+    os.utime(tmp_path / "second", (2, 2))
+    assert cache.load("first") is not None
+
+    cache.store("third", entry(2))
+    assert cache.load("second") is None
+    assert cache.load("first") is not None
+    assert cache.load("third") is not None
+    assert sum(size for _, size, _ in cache.entries()) <= cache.max_bytes
+
+
+def test_new_entry_kept(tmp_path):
+    """An entry larger than the whole cache survives its own store."""
+    cache = FieldCache(str(tmp_path), max_bytes=1)
+    cache.store("old", entry(0))
+    cache.store("new", entry(1))
+    assert [key for _, _, key in cache.entries()] == ["new"]
+    cache.clear()
+    assert cache.entries() == []
+
+
+def test_field_cache_hit(tmp_path):
+    solved = ElectricField(make_grid(), cache=str(tmp_path))
+    grid = make_grid(Vin=500, Vout=0, Vwall=250)
+    loaded = ElectricField(grid, cache=str(tmp_path))
+    # the voltages are not part of the key and the hit never assembles A
+    assert grid._A is None
+    np.testing.assert_array_equal(loaded.V_basis, solved.V_basis)
+    solved.set_voltages(500, 0, 250)
+    np.testing.assert_allclose(loaded.V, solved.V, rtol=0, atol=1e-12 * 500)
+    assert ElectricField(make_grid(), solver="mgcg", cache=str(tmp_path)).cache_key() != solved.cache_key()
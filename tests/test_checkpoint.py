@@ -0,0 +1,112 @@
+"""Checkpoint and restart against an uninterrupted run."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from pic.checkpoint import (
+    latest_checkpoint,
+    list_checkpoints,
+    restore_checkpoint,
+    save_checkpoint,
+)
+from pic.field import ElectricField
+from pic.integrator import boris
+from pic.particle import Injector, Particles
+from pic.recorder import Recorder, load_recording
+
+DT = 2e-8
+STEPS = 30
+
+
+@pytest.fixture(scope="module")
+def field(grid):
+    return ElectricField(grid)
+
+
+def new_run(grid, field):
+    """Return the particles of a run with injection and wall absorption."""
+    injector = Injector(2e8, grid.height, v0=2e4, v_th=5e3, seed=1)
+    particles = Particles(20, grid.height, 2e4, injector=injector, absorb_wall=True)
+    field.set_voltages(grid.Vin, grid.Vout, grid.Vwall)
+    return particles
+
+
+def run(particles, field, grid, recorder, start, stop, checkpoint_dir=None):
+    """Push from step start to stop, checkpointing every 10 steps."""
+    for k in range(start, stop):
+        particles.push(boris, field, DT, grid)
+        recorder.record(k + 1, particles.time, particles, field)
+        if checkpoint_dir and (k + 1) % 10 == 0:
+            save_checkpoint(checkpoint_dir, k + 1, particles, recorder, field)
+
+
+def test_restart_matches(tmp_path, grid, field):
+    ids = np.arange(40)
+    particles = new_run(grid, field)
+    recorder = Recorder(str(tmp_path / "full"), ids, chunk_size=4)
+    recorder.record(0, 0.0, particles, field)
+    run(particles, field, grid, recorder, 0, STEPS)
+    recorder.close()
+
+    # the same run, stopped after step 20 and restarted from the checkpoint
+    # of step 10 (the recorder has written chunks past it by then)
+    interrupted = new_run(grid, field)
+    recorder = Recorder(str(tmp_path / "rec"), ids, chunk_size=4)
+    recorder.record(0, 0.0, interrupted, field)
+    run(interrupted, field, grid, recorder, 0, 20, str(tmp_path / "ckpt"))
+    recorder.close()
+    path = list_checkpoints(str(tmp_path / "ckpt"))[0]
+
+    restarted = new_run(grid, field)
+    field.set_voltages(0, 0, 0)
+    state = restore_checkpoint(path, restarted, field)
+    assert state["step"] == 10
+    np.testing.assert_array_equal(field.voltages, [grid.Vin, grid.Vout, grid.Vwall])
+    recorder = Recorder(str(tmp_path / "rec"), ids, chunk_size=4, resume=state["recorder"])
+    run(restarted, field, grid, recorder, state["step"], STEPS)
+    recorder.close()
+
+    assert restarted.num == particles.num
+    assert restarted.time == particles.time
+    assert restarted.n_injected == particles.n_injected
+    assert restarted.n_absorbed == particles.n_absorbed
+    assert restarted.n_wall_hits == particles.n_wall_hits
+    np.testing.assert_array_equal(restarted.ids, particles.ids)
+    np.testing.assert_array_equal(restarted.positions, particles.positions)
+    np.testing.assert_array_equal(restarted.velocities, particles.velocities)
+
+    full = load_recording(str(tmp_path / "full"))
+    resumed = load_recording(str(tmp_path / "rec"))
+    for key in ("ids", "step", "time", "positions", "energies"):
+        np.testing.assert_array_equal(resumed[key], full[key])
+
+
+def test_keep_latest(tmp_path, grid, field):
+    particles = new_run(grid, field)
+    directory = str(tmp_path)
+    for step in (10, 20, 30):
+        save_checkpoint(directory, step, particles, keep=2)
+    paths = list_checkpoints(directory)
+    assert [os.path.basename(p) for p in paths] == ["checkpoint_000000020", "checkpoint_000000030"]
+    assert latest_checkpoint(directory) == paths[-1]
+    assert latest_checkpoint(str(tmp_path / "empty")) is None
+
+
+def test_version_mismatch(tmp_path, grid, field):
+    path = save_checkpoint(str(tmp_path), 1, new_run(grid, field))
+    with open(os.path.join(path, "state.json")) as f:
+        state = json.load(f)
+    state["version"] = -1
+    with open(os.path.join(path, "state.json"), "w") as f:
+        json.dump(state, f)
+    with pytest.raises(ValueError):
+        restore_checkpoint(path, new_run(grid, field))
+
+
+def test_injector_required(tmp_path, grid, field):
+    path = save_checkpoint(str(tmp_path), 1, new_run(grid, field))
+    with pytest.raises(ValueError):
+        restore_checkpoint(path, Particles(20, grid.height))
@@ -0,0 +1,26 @@
+"""Convergence orders fitted by the pusher study."""
+
+import numpy as np
+import pytest
+
+from pic.convergence import self_convergence_order
+
+
+@pytest.mark.parametrize("n", [3, 5])
+def test_self_convergence_order(n):
+    """An error in the size held fixed does not change the order."""
+    rng = np.random.default_rng(0)
+    exact = rng.uniform(size=(50, 2))
+    fixed = 0.1 * rng.normal(size=(50, 2))
+    shape = rng.normal(size=(50, 2))
+    sizes = 0.1 / 2.0 ** np.arange(n)
+    positions = [exact + fixed + shape * s**2 for s in sizes]
+    assert self_convergence_order(sizes, positions) == pytest.approx(2.0)
+
+
+def test_floor_dropped():
+    """Changes stalled at a floor are left out of the fit."""
+    sizes = 0.1 / 2.0 ** np.arange(5)
+    shape = np.ones((1, 2))
+    positions = [shape * (s**4 + 1e-9 * (i % 2)) for i, s in enumerate(sizes)]
+    assert self_convergence_order(sizes, positions) == pytest.approx(4.0, abs=0.1)
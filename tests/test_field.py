@@ -0,0 +1,75 @@
+"""Superposed basis fields against direct solves of the grid system."""
+
+import numpy as np
+import pytest
+from scipy.interpolate import RegularGridInterpolator
+from scipy.sparse.linalg import spsolve
+
+from pic.field import ElectricField, sinusoid
+from pic.grid import make_array
+
+from conftest import make_grid
+
+
+def direct_solve(grid):
+    """Return the potential of the grid voltages solved directly."""
+    V = spsolve(grid.get_A().tocsc(), grid.get_b())
+    return make_array(V, grid.Nx, grid.Ny)
+
+
+@pytest.mark.parametrize(
+    "voltages",
+    [dict(Vin=1100, Vout=-100, Vwall=1000), dict(Vin=-37.5, Vout=412.0, Vwall=3.25)],
+)
+def test_superposition(voltages):
+    grid = make_grid(**voltages)
+    field = ElectricField(grid)
+    V = direct_solve(grid)
+    span = np.ptp(list(voltages.values()))
+    np.testing.assert_allclose(field.V, V, rtol=0, atol=1e-7 * span)
+    Ex, Ey = field.solve_E(V)
+    np.testing.assert_allclose(field.Ex, Ex, rtol=0, atol=1e-7 * span / grid.h)
+    np.testing.assert_allclose(field.Ey, Ey, rtol=0, atol=1e-7 * span / grid.h)
+
+
+def test_set_voltages(grid):
+    field = ElectricField(grid)
+    field.set_voltages(250, 10, -600)
+    other = make_grid(Vin=250, Vout=10, Vwall=-600)
+    np.testing.assert_allclose(field.V, direct_solve(other), rtol=0, atol=1e-7 * 850)
+
+
+def test_waveform(grid):
+    rf = sinusoid(1000, 200, 13.56e6)
+    field = ElectricField(grid, waveforms={"Vwall": rf})
+    t = 1.3e-8
+    field.update(t)
+    expected = ElectricField(grid)
+    expected.set_voltages(grid.Vin, grid.Vout, rf(t))
+    np.testing.assert_allclose(field.voltages, [grid.Vin, grid.Vout, rf(t)])
+    np.testing.assert_allclose(field.V, expected.V, rtol=0, atol=1e-9)
+
+
+def test_unknown_electrode(grid):
+    with pytest.raises(ValueError):
+        ElectricField(grid, waveforms={"Vgrid": lambda t: 0})
+
+
+def test_gather(grid):
+    field = ElectricField(grid)
+    xs, ys = grid.Xs[0], grid.Ys[:, 0]
+    rng = np.random.default_rng(0)
+    inside = rng.uniform((0, 0), (xs[-1], ys[-1]), (500, 2))
+    nodes = np.column_stack((xs[[0, 7, -1]], ys[[0, 3, -1]]))
+    outside = np.array([[-1e-3, 5e-3], [0.06, 0.01], [0.02, -1.0], [0.07, 0.03]])
+    positions = np.concatenate((inside, nodes, outside))
+
+    E, V = field.gather(positions, potential=True)
+    # outside points take the value at the nearest grid edge
+    clamped = np.clip(positions, (xs[0], ys[0]), (xs[-1], ys[-1]))[:, ::-1]
+    for values, result in ((field.Ex, E[:, 0]), (field.Ey, E[:, 1]), (field.V, V)):
+        reference = RegularGridInterpolator((ys, xs), values)(clamped)
+        scale = np.abs(values).max()
+        np.testing.assert_allclose(result, reference, rtol=0, atol=1e-12 * scale)
+    np.testing.assert_allclose(field.get_field_at(positions[0]), E[0])
+    np.testing.assert_allclose(field.get_potential_at(positions[0]), V[0])
@@ -0,0 +1,25 @@
+"""The axisymmetric Laplacian and node volumes."""
+
+import numpy as np
+import pytest
+
+from conftest import make_grid
+
+
+@pytest.mark.parametrize("refine", [1, 4])
+def test_harmonic(refine):
+    """A maps the harmonic r**2 - 2 z**2 to zero off the Dirichlet nodes."""
+    grid = make_grid(refine=refine, refine_width=2e-3, axisymmetric=True)
+    z, r = np.meshgrid(grid.xs, grid.ys, indexing="ij")
+    V = (r**2 - 2 * z**2).ravel()
+    _, _, _, axis, _, interior = grid.get_node_types()
+    residual = grid.get_A() @ V
+    scale = 4 / grid.h_min**2 * np.abs(V).max()
+    np.testing.assert_allclose(residual[interior | axis], 0, atol=1e-9 * scale)
+
+
+def test_node_volumes():
+    """The rings of a column of nodes fill the disk of the domain radius."""
+    grid = make_grid(axisymmetric=True)
+    disk = grid.node_volumes().sum(axis=0) / np.gradient(grid.xs)
+    np.testing.assert_allclose(disk, np.pi * grid.ys[-1] ** 2, rtol=1e-12)
@@ -0,0 +1,72 @@
+"""Gyration of the magnetized pushers against the analytic orbit."""
+
+import numpy as np
+import pytest
+
+from pic.integrator import boris, rk4, tajima_explicit, tajima_implicit
+
+QM = 1e5
+BZ = 0.5
+OMEGA = QM * BZ
+DT = 0.01 / OMEGA
+# steps in one gyration period
+STEPS = int(round(2 * np.pi / (OMEGA * DT)))
+B = np.array([0.0, 0.0, BZ])
+
+# rotation angle and speed gain of one step of each scheme
+ROTATION = {
+    boris: (2 * np.arctan(OMEGA * DT / 2), 1.0),
+    tajima_implicit: (2 * np.arctan(OMEGA * DT / 2), 1.0),
+    tajima_explicit: (np.arctan(OMEGA * DT), np.hypot(1.0, OMEGA * DT)),
+}
+
+
+def gyrate(pusher, v0, E=(0.0, 0.0), steps=STEPS):
+    """Push particles from the origin in a uniform E and B."""
+    x = np.zeros_like(v0)
+    v = v0.copy()
+
+    def fields(pos):
+        return np.tile(E, (len(pos), 1)), B
+
+    for _ in range(steps):
+        x, v = pusher(x, v, fields, QM, DT)
+    return x, v
+
+
+def rotate(v, angle):
+    """Rotate rows of v clockwise by angle, the sense of positive qm * Bz."""
+    c, s = np.cos(angle), np.sin(angle)
+    return np.column_stack((c * v[:, 0] + s * v[:, 1], c * v[:, 1] - s * v[:, 0]))
+
+
+V0 = np.array([[2e3, 0.0], [0.0, -5e2], [1e3, 1e3]])
+
+
+@pytest.mark.parametrize("pusher", list(ROTATION), ids=lambda p: p.__name__)
+def test_rotation_per_step(pusher):
+    angle, gain = ROTATION[pusher]
+    _, v = gyrate(pusher, V0)
+    expected = gain**STEPS * rotate(V0, STEPS * angle)
+    np.testing.assert_allclose(v, expected, rtol=0, atol=1e-12 * np.abs(V0).max())
+
+
+@pytest.mark.parametrize("pusher", [boris, tajima_implicit, rk4], ids=lambda p: p.__name__)
+def test_orbit(pusher):
+    t = STEPS * DT
+    x, v = gyrate(pusher, V0)
+    radius = np.linalg.norm(V0, axis=1, keepdims=True) / OMEGA
+    np.testing.assert_allclose(v, rotate(V0, OMEGA * t), rtol=0, atol=1e-4 * np.abs(V0).max())
+    # the orbit centre lies a gyroradius to the right of the initial velocity
+    centre = rotate(V0, np.pi / 2) / OMEGA
+    expected = centre - rotate(V0, OMEGA * t + np.pi / 2) / OMEGA
+    assert np.all(np.linalg.norm(x - expected, axis=1) <= 1e-4 * radius[:, 0])
+
+
+@pytest.mark.parametrize("pusher", [boris, tajima_implicit], ids=lambda p: p.__name__)
+def test_exb_drift(pusher):
+    E = (0.0, 1e2)
+    x, _ = gyrate(pusher, np.zeros((1, 2)), E)
+    drift = x[0] / (STEPS * DT)
+    # E x B / B^2 points along +x for E along +y and B along +z
+    np.testing.assert_allclose(drift, [E[1] / BZ, 0.0], rtol=0, atol=1e-3 * E[1] / BZ)
@@ -0,0 +1,86 @@
+"""The numba kernel against the NumPy push and boundary handling."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+from pic.field import ElectricField
+from pic.integrator import boris, euler, leapfrog, rk4
+from pic.particle import Particles
+
+PUSHERS = [euler, rk4, leapfrog, boris]
+FIELDS = [None, np.array([0.0, 0.0, 0.5])]
+
+
+@pytest.fixture(scope="module", params=["float64", "float32"])
+def field(request, grid):
+    return ElectricField(grid, dtype=request.param)
+
+
+def random_state(grid, n, speed, dtype=np.float64, seed=0):
+    """Return positions outside the biased wall and velocities of a given speed."""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform((0, 0), (grid.length, grid.height), (4 * n, 2))
+    in_wall = (
+        (pos[:, 0] >= grid.x_wall)
+        & (pos[:, 0] <= grid.x_wall + grid.w_wall)
+        & (pos[:, 1] <= grid.h_wall)
+    )
+    pos = pos[~in_wall][:n]
+    angle = rng.uniform(0, 2 * np.pi, n)
+    vel = speed * np.column_stack((np.cos(angle), np.sin(angle)))
+    return pos.astype(dtype), vel.astype(dtype)
+
+
+def run(backend, pos, vel, pusher, field, grid, dt, B, steps):
+    """Push a copy of a state, absorbing at the outlet and the wall."""
+    particles = Particles(
+        len(pos), grid.height, absorb_wall=True, backend=backend, dtype=pos.dtype
+    )
+    particles.positions[:] = pos
+    particles.velocities[:] = vel
+    for _ in range(steps):
+        particles.push(pusher, field, dt, grid, B)
+    return particles
+
+
+@pytest.mark.parametrize("B", FIELDS, ids=["E", "EB"])
+@pytest.mark.parametrize("pusher", PUSHERS, ids=lambda p: p.__name__)
+@pytest.mark.parametrize(
+    "speed, dt, steps",
+    [(1e4, 1e-8, 20), (2e5, 2e-8, 5)],
+    ids=["drift", "collisions"],
+)
+def test_parity(pusher, B, speed, dt, steps, field, grid):
+    if field.dtype == np.float32:
+        # the backends round differently in float32, compare single steps
+        steps = 1
+    pos, vel = random_state(grid, 2000, speed, field.dtype)
+    expected = run("numpy", pos, vel, pusher, field, grid, dt, B, steps)
+    result = run("numba", pos, vel, pusher, field, grid, dt, B, steps)
+
+    assert result.n_absorbed == expected.n_absorbed
+    np.testing.assert_array_equal(result.ids, expected.ids)
+    if field.dtype == np.float64:
+        np.testing.assert_array_equal(result.positions, expected.positions)
+        np.testing.assert_array_equal(result.velocities, expected.velocities)
+    else:
+        # points stopped at a boundary are interpolated from the start point
+        scale = np.maximum(
+            np.linalg.norm(pos[result.ids], axis=1),
+            np.linalg.norm(expected.positions, axis=1),
+        )
+        x_ulp = np.spacing(scale)[:, None]
+        v_ulp = np.spacing(np.linalg.norm(expected.velocities, axis=1, keepdims=True))
+        assert np.all(np.abs(result.positions - expected.positions) <= 2 * x_ulp)
+        assert np.all(np.abs(result.velocities - expected.velocities) <= 4 * v_ulp)
+
+
+def test_collisions_happen(field, grid):
+    """The collision case reaches every absorbing face, so its parity means something."""
+    pos, vel = random_state(grid, 2000, 2e5, field.dtype)
+    particles = run("numpy", pos, vel, euler, field, grid, 2e-8, None, 5)
+    assert particles.n_absorbed["outlet"] > 0
+    assert particles.n_absorbed["wall"] > 0
+    assert particles.n_absorbed["inlet"] > 0
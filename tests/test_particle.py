@@ -0,0 +1,127 @@
+"""Subcycled pushes against pushes with a fine step."""
+
+import numpy as np
+import pytest
+
+from pic.field import ElectricField
+from pic.integrator import boris, euler, leapfrog, rk4, tajima_implicit
+from pic.particle import M, Q, Particles, Subcycling, advance
+
+QM = Q / M
+DT = 1e-7
+STEPS = 3
+FIELDS = [None, np.array([0.0, 0.0, 0.3])]
+
+
+@pytest.fixture(scope="module")
+def field(grid):
+    return ElectricField(grid)
+
+
+@pytest.fixture(scope="module")
+def state():
+    """Particles in the middle of the domain, clear of every boundary for STEPS * DT."""
+    rng = np.random.default_rng(0)
+    n = 300
+    pos = np.column_stack((rng.uniform(0.025, 0.035, n), rng.uniform(0.008, 0.012, n)))
+    angle = rng.uniform(0, 2 * np.pi, n)
+    vel = rng.uniform(1e2, 1.5e4, n)[:, None] * np.column_stack((np.cos(angle), np.sin(angle)))
+    return pos, vel
+
+
+def push_fine(state, pusher, field, grid, B, level):
+    """Push every particle with steps of DT / 2**level."""
+    x, v = (a.copy() for a in state)
+    for _ in range(STEPS * 2**level):
+        masks = advance(x, v, pusher, field, QM, DT / 2**level, grid, B, "numpy")
+        assert not any(mask.any() for mask in masks)
+    return x, v
+
+
+def push_subcycled(state, pusher, field, grid, B, subcycling):
+    """Push with subcycling, returning the levels taken every step."""
+    x, v = (a.copy() for a in state)
+    levels = []
+    for _ in range(STEPS):
+        subcycling.advance(x, v, pusher, field, QM, DT, grid, B, "numpy")
+        levels.append(subcycling.levels)
+    return x, v, np.array(levels)
+
+
+@pytest.mark.parametrize("B", FIELDS, ids=["E", "EB"])
+@pytest.mark.parametrize("pusher", [euler, leapfrog, boris, rk4], ids=lambda p: p.__name__)
+def test_max_level_is_fine_step(state, pusher, field, grid, B):
+    """With every particle at the top level, subcycling is the fine step."""
+    x, v, levels = push_subcycled(state, pusher, field, grid, B, Subcycling(4, cfl=1e-6))
+    assert np.all(levels == 4)
+    x_fine, v_fine = push_fine(state, pusher, field, grid, B, 4)
+    np.testing.assert_array_equal(x, x_fine)
+    np.testing.assert_array_equal(v, v_fine)
+
+
+@pytest.mark.parametrize("B", FIELDS, ids=["E", "EB"])
+def test_error_control(state, field, grid, B):
+    """Tighter tolerances raise the levels and approach the fine step."""
+    x_ref, _ = push_fine(state, leapfrog, field, grid, B, 10)
+    errors = []
+    previous = None
+    for tol in (None, 1e-5, 1e-7):
+        x, _, levels = push_subcycled(state, leapfrog, field, grid, B, Subcycling(8, tol=tol))
+        if previous is not None:
+            assert np.all(levels >= previous)
+        previous = levels
+        errors.append(np.abs(x - x_ref).max())
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[2] < errors[0] / 5
+    assert errors[0] < 0.05 * grid.h
+
+
+def test_gyration_limits_substep(state, field, grid):
+    """A strong B field subdivides the step to at most cfl radians per substep."""
+    B = np.array([0.0, 0.0, 50.0])
+    subcycling = Subcycling(8)
+    levels = subcycling.select_levels(*state, boris, field, QM, DT, grid, B)
+    assert np.all(DT / 2.0**levels * QM * B[2] <= subcycling.cfl)
+
+
+def test_gyration_field_at_particles(state, field, grid):
+    """A callable B limits the substep with |B| at each particle."""
+    B = np.array([0.0, 0.0, 50.0])
+    subcycling = Subcycling(8)
+    uniform = subcycling.select_levels(*state, boris, field, QM, DT, grid, B)
+    same = subcycling.select_levels(
+        *state, boris, field, QM, DT, grid, lambda x: np.broadcast_to(B, (len(x), 3))
+    )
+    np.testing.assert_array_equal(same, uniform)
+
+    # strong in the upper half of the particles only
+    levels = subcycling.select_levels(
+        *state, boris, field, QM, DT, grid, lambda x: np.where(x[:, 1:] > 0.01, B, 0.0)
+    )
+    upper = state[0][:, 1] > 0.01
+    np.testing.assert_array_equal(levels[upper], uniform[upper])
+    assert np.all(levels[~upper] <= uniform[~upper])
+    assert np.any(levels[~upper] < uniform[~upper])
+
+
+def test_error_control_needs_order(state, field, grid):
+    with pytest.raises(ValueError):
+        Subcycling(4, tol=1e-3).select_levels(*state, tajima_implicit, field, QM, DT, grid)
+
+
+def test_wall_points_buffer(field, grid):
+    """Wall events come from one scratch buffer that follows the storage."""
+    particles = Particles(0, grid.height, backend="numpy", capacity=8)
+    buffer = particles._wall_points
+    # heading into the left face of the wall
+    x = np.column_stack((np.full(8, grid.x_wall - 1e-4), np.linspace(0.001, 0.003, 8)))
+    particles.inject(x, np.tile([2e4, 0.0], (8, 1)))
+    particles.push(euler, field, 1e-8, grid)
+    assert particles._wall_points is buffer
+    ids, points, _ = particles.last_events["wall"]
+    assert len(ids) == 8
+    np.testing.assert_allclose(points[:, 0], grid.x_wall)
+
+    particles.inject(particles.positions.copy(), particles.velocities.copy())
+    particles.push(euler, field, 1e-8, grid)
+    assert particles._wall_points.shape == particles._positions.shape == (16, 2)
@@ -0,0 +1,59 @@
+"""The multigrid solvers against the direct sparse solve."""
+
+import numpy as np
+import pytest
+from scipy.sparse.linalg import spsolve
+
+from pic.defaults import VOLTAGES
+from pic.solver import MultigridSolver
+
+from conftest import make_grid
+
+SPAN = max(VOLTAGES.values()) - min(VOLTAGES.values())
+
+
+def sized_grid(nx, ny, h=1e-3):
+    """Return the default geometry stretched to nx by ny nodes."""
+    return make_grid(h, length=(nx + 0.5) * h, height=(ny + 0.5) * h)
+
+
+@pytest.mark.parametrize("method", ["vcycle", "cg"])
+@pytest.mark.parametrize("shape", [(50, 20), (51, 21), (64, 32), (65, 33), (51, 20)])
+def test_matches_spsolve(shape, method):
+    grid = sized_grid(*shape)
+    assert (grid.Nx, grid.Ny) == shape
+    b = grid.get_b()
+    solver = MultigridSolver(grid, tol=1e-10, method=method)
+    V = solver.solve(b)
+    assert solver.residual <= 1e-10
+    np.testing.assert_allclose(V, spsolve(grid.get_A().tocsc(), b), rtol=0, atol=1e-7 * SPAN)
+
+
+@pytest.mark.parametrize("method", ["vcycle", "cg"])
+def test_warm_start(method):
+    """A close initial guess saves iterations, measured against the same tolerance."""
+    grid = sized_grid(64, 32)
+    b = grid.get_b()
+    solver = MultigridSolver(grid, tol=1e-10, method=method)
+    V = solver.solve(b)
+    cold = solver.iterations
+    solver.solve(b, V)
+    assert solver.iterations == 0
+
+    V_new = solver.solve(1.01 * b, V)
+    assert 0 < solver.iterations < cold
+    assert solver.residual <= 1e-10
+    np.testing.assert_allclose(V_new, 1.01 * V, rtol=0, atol=1e-7 * SPAN)
+
+
+def test_zero_rhs():
+    grid = sized_grid(50, 20)
+    solver = MultigridSolver(grid)
+    V = solver.solve(np.zeros(grid.Nx * grid.Ny))
+    assert solver.iterations == 0
+    assert not V.any()
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        MultigridSolver(sized_grid(50, 20), method="jacobi")
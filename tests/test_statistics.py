@@ -0,0 +1,68 @@
+"""Running moments and histograms merged from batches."""
+
+import numpy as np
+import pytest
+
+from pic.field import ElectricField
+from pic.statistics import (
+    EnsembleStatistics,
+    Histogram,
+    InletDistribution,
+    RunningMoments,
+    run_batch,
+)
+
+
+@pytest.fixture(scope="module")
+def values():
+    rng = np.random.default_rng(0)
+    # a large offset against a small spread, where a naive sum of squares fails
+    return 1e6 + rng.normal(0, 1e-2, 10001)
+
+
+@pytest.mark.parametrize("splits", [[], [1], [5000], [3, 700, 701, 9000]])
+def test_moments_merge(values, splits):
+    moments = RunningMoments()
+    for batch in np.split(values, splits):
+        part = RunningMoments()
+        part.add(batch)
+        moments.merge(part)
+    assert moments.n == len(values)
+    np.testing.assert_allclose(moments.mean, np.mean(values), rtol=1e-15)
+    np.testing.assert_allclose(moments.variance, np.var(values, ddof=1), rtol=1e-9)
+    assert (moments.min, moments.max) == (values.min(), values.max())
+
+
+def test_moments_empty():
+    moments = RunningMoments()
+    moments.add([])
+    moments.merge(RunningMoments())
+    assert moments.n == 0
+    assert moments.to_dict()["mean"] is None
+    moments.add([2.0])
+    assert np.isnan(moments.variance)
+
+
+def test_histogram_merge():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(-0.5, 10.5, 5000)
+    values[:3] = 10.0
+    histogram = Histogram(0, 10, 20)
+    for batch in np.array_split(values, 7):
+        part = Histogram(0, 10, 20)
+        part.add(batch)
+        histogram.merge(part)
+    expected, _ = np.histogram(values, bins=20, range=(0, 10))
+    np.testing.assert_array_equal(histogram.counts, expected)
+    assert histogram.underflow == np.count_nonzero(values < 0)
+    assert histogram.overflow == np.count_nonzero(values > 10)
+    with pytest.raises(ValueError):
+        histogram.merge(Histogram(0, 10, 10))
+
+
+def test_batch_follows_waveforms(grid):
+    """Each step of a batch applies the electrode waveforms at its start time."""
+    fields = ElectricField(grid, waveforms={"Vwall": lambda t: grid.Vwall + 1e9 * t})
+    dt = 1e-8
+    run_batch(fields, 10, InletDistribution(), 0, EnsembleStatistics(grid), dt=dt, max_steps=5)
+    assert fields.voltages[2] == pytest.approx(grid.Vwall + 1e9 * 4 * dt)